@@ -5,29 +5,42 @@ Main entry point for the RWM dataset tools.
 import os
 import sys
 import logging
-import argparse
-from typing import Dict, Any, Optional, List
+import numpy as np
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Dict, Any, Optional, List
+
+if TYPE_CHECKING:
+    import argparse
 
 from rwm_dataset_tools.utils.config import load_config
+from rwm_dataset_tools.utils.logging import setup_logging
+from rwm_dataset_tools.utils.path import DEFAULT_COPY_WORKERS
 from rwm_dataset_tools.dataset.extraction import DatasetExtractor
 from rwm_dataset_tools.dataset.formats.yolov5 import YOLOv5Format
 from rwm_dataset_tools.dataset.formats.yolov11 import YOLOv11Format
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
-
-file_handler = logging.FileHandler('rwm_extraction.log')
-file_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-logging.getLogger().addHandler(file_handler)
-
 logger = logging.getLogger(__name__)
 
-def parse_arguments() -> argparse.Namespace:
+def parse_arguments() -> 'argparse.Namespace':
+    # Without arguments every option takes its default; skip importing and building the parser
+    if len(sys.argv) == 1:
+        return SimpleNamespace(
+            config='config/models/yolov11.yaml',
+            format='yolov11',
+            output_dir=None,
+            seed=42,
+            log_level='INFO',
+            debug_db=False,
+            dry_run=False,
+            copy_images=False,
+            link_mode='symlink',
+            copy_workers=DEFAULT_COPY_WORKERS,
+            io_uring=False,
+            output_base_dir='/fast_data'
+        )
+    
+    import argparse
+    
     parser = argparse.ArgumentParser(description='RWM Dataset Tools')
     
     parser.add_argument(
@@ -81,7 +94,29 @@ def parse_arguments() -> argparse.Namespace:
     parser.add_argument(
         '--copy-images', 
         action='store_true',
-        help='Copy images instead of creating symlinks (useful for faster storage)'
+        help='Copy images instead of creating symlinks (same as --link-mode copy)'
+    )
+
+    parser.add_argument(
+        '--link-mode',
+        type=str,
+        choices=['symlink', 'hardlink', 'copy'],
+        default='symlink',
+        help='How images are placed in the dataset (default: symlink). '
+             'hardlink requires the output on the same file system as the images'
+    )
+
+    parser.add_argument(
+        '--copy-workers',
+        type=int,
+        default=DEFAULT_COPY_WORKERS,
+        help=f'Number of threads used to copy images (default: {DEFAULT_COPY_WORKERS})'
+    )
+
+    parser.add_argument(
+        '--io-uring',
+        action='store_true',
+        help='Create image and label files in batches with io_uring (Linux with liburing only)'
     )
 
     parser.add_argument(
@@ -100,9 +135,8 @@ def main() -> None:
     # Parse arguments
     args = parse_arguments()
     
-    # Set logging level
-    logging_level = getattr(logging, args.log_level)
-    logging.getLogger().setLevel(logging_level)
+    # Log to the console and rwm_extraction.log at the requested level
+    setup_logging(args.log_level, log_file='rwm_extraction.log')
     
     # Print startup information
     logger.info("=" * 80)
@@ -135,10 +169,18 @@ def main() -> None:
         config['dataset']['output_dir'] = os.path.join(args.output_base_dir, f"rwm_dataset_{args.format}")
         logger.info(f"Using default output directory: {config['dataset']['output_dir']}")
 
-    # Set image copying mode
-    config['dataset']['copy_images'] = args.copy_images
-    if args.copy_images:
-        logger.info("Images will be copied instead of symlinked")
+    # Set image linking mode
+    link_mode = 'copy' if args.copy_images else args.link_mode
+    config['dataset']['link_mode'] = link_mode
+    config['dataset']['copy_images'] = link_mode == 'copy'
+    config['dataset']['copy_workers'] = args.copy_workers
+    if link_mode == 'copy':
+        logger.info(f"Images will be copied instead of symlinked ({args.copy_workers} workers)")
+    elif link_mode == 'hardlink':
+        logger.info("Images will be hardlinked instead of symlinked")
+    if args.io_uring:
+        config['dataset']['use_io_uring'] = True
+        logger.info("Image and label files will be created with io_uring where available")
         
     config['random_seed'] = args.seed
     
@@ -222,11 +264,9 @@ def main() -> None:
         if stats['total_images'] > 0:
             logger.info(f"Average annotations per image: {stats['total_annotations'] / stats['total_images']:.2f}")
             
-        train_pct = stats['train_images'] / stats['total_images'] * 100 if stats['total_images'] > 0 else 0
-        val_pct = stats['val_images'] / stats['total_images'] * 100 if stats['total_images'] > 0 else 0
-        test_pct = stats['test_images'] / stats['total_images'] * 100 if stats['total_images'] > 0 else 0
-        
-        logger.info(f"Split percentages: Train {train_pct:.1f}% / Val {val_pct:.1f}% / Test {test_pct:.1f}%")
+        split_counts = np.array([stats['train_images'], stats['val_images'], stats['test_images']], dtype=np.int64)
+        split_pcts = split_counts * 100.0 / max(stats['total_images'], 1)
+        logger.info("Split percentages: Train %.1f%% / Val %.1f%% / Test %.1f%%", *split_pcts)
         
         # Add output location information
         output_dir = config['dataset']['output_dir']
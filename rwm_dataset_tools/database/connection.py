@@ -4,12 +4,16 @@ Database connection handling for RWM dataset extraction.
 import pyodbc
 import pandas as pd
 import logging
-from typing import Dict, Any, Optional, List, Tuple
+from typing import Dict, Any, Optional, List, Tuple, Iterator
 import warnings
 
 warnings.filterwarnings("ignore", category=UserWarning, module="pandas.io.sql")
 logger = logging.getLogger(__name__)
 
+# pyodbc already enables ODBC connection pooling by default; pin it so connect/disconnect
+# cycles keep reusing driver connections (must be set before the first connect)
+pyodbc.pooling = True
+
 class RWMDatabase:
     """
     Class for handling database connections to the RoboWeedMaps database.
@@ -23,6 +27,10 @@ class RWMDatabase:
         """
         self.config = config
         self.connection = None
+        
+        # Cursors keyed by SQL text; pyodbc re-executes a cursor's last statement without re-preparing it
+        self._prepared = {}
+        
         self.conn_str = (
             f"DRIVER={{{config['driver']}}};"
             f"SERVER={config['server']};"
@@ -31,29 +39,44 @@ class RWMDatabase:
             f"PWD={config['password']};"
         )
         
+        # Masked copy for logging, built from the same fields so only the PWD value is hidden
+        self._safe_conn_str = (
+            self.conn_str.replace(f"PWD={config['password']};", "PWD=********;")
+            if config.get('password') else self.conn_str
+        )
+        
     def connect(self) -> None:
         """
         Establish a connection to the RWM database.
         """
         logger.info(f"Connecting to database {self.config['name']} on {self.config['server']}...")
-        logger.debug(f"Connection string: {self.conn_str.replace(self.config['password'], '********')}")
+        logger.debug(f"Connection string: {self._safe_conn_str}")
         
         try:
-            self.connection = pyodbc.connect(self.conn_str)
+            # Autocommit avoids wrapping every read-only query in an implicit transaction
+            self.connection = pyodbc.connect(
+                self.conn_str,
+                autocommit=True,
+                readonly=True,
+                timeout=self.config.get('timeout', 30)
+            )
             logger.info(f"Connected to database {self.config['name']} on {self.config['server']}")
             
-            # Test the connection with a simple query
+            # Test the connection and get basic database info in a single batch
             cursor = self.connection.cursor()
-            cursor.execute("SELECT @@VERSION")
+            cursor.execute(
+                "SELECT @@VERSION; "
+                "SELECT COUNT(*) FROM [data].[Images]; "
+                "SELECT COUNT(*) FROM [data].[Annotations];"
+            )
             version = cursor.fetchone()[0]
             logger.info(f"SQL Server version: {version.split()[0]}")
             
-            # Get basic database info
-            cursor.execute("SELECT COUNT(*) FROM [data].[Images]")
+            cursor.nextset()
             image_count = cursor.fetchone()[0]
             logger.info(f"Total images in database: {image_count}")
             
-            cursor.execute("SELECT COUNT(*) FROM [data].[Annotations]")
+            cursor.nextset()
             annotation_count = cursor.fetchone()[0]
             logger.info(f"Total annotations in database: {annotation_count}")
             
@@ -71,6 +94,9 @@ class RWMDatabase:
         Close the database connection.
         """
         if self.connection:
+            for cursor in self._prepared.values():
+                cursor.close()
+            self._prepared.clear()
             self.connection.close()
             self.connection = None
             logger.info("Database connection closed")
@@ -101,9 +127,78 @@ class RWMDatabase:
                 logger.error(f"Params: {params}")
             raise
             
+    def execute_query_chunks(
+        self, 
+        query: str, 
+        params: Optional[Tuple] = None, 
+        chunksize: int = 200_000
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Execute a SQL query and yield the results as a sequence of DataFrames.
+        
+        Args:
+            query: SQL query string
+            params: Optional parameters for the query
+            chunksize: Maximum number of rows per chunk
+            
+        Yields:
+            DataFrames with consecutive chunks of the query results
+        """
+        if not self.connection:
+            self.connect()
+            
+        try:
+            yield from pd.read_sql(query, self.connection, params=params, chunksize=chunksize)
+        except Exception as e:
+            logger.error(f"Query execution failed: {e}")
+            logger.error(f"Query: {query}")
+            if params:
+                logger.error(f"Params: {params}")
+            raise
+            
+    def execute_batch(self, query: str, params: Optional[Tuple] = None) -> List[pd.DataFrame]:
+        """
+        Execute a multi-statement SQL batch and return every result set.
+        
+        Args:
+            query: SQL batch with one or more statements
+            params: Optional parameters for the batch
+            
+        Returns:
+            List with one DataFrame per result set, in statement order
+        """
+        if not self.connection:
+            self.connect()
+            
+        cursor = self.connection.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+                
+            results = []
+            while True:
+                # Statements without a result set have no description
+                if cursor.description is not None:
+                    columns = [column[0] for column in cursor.description]
+                    rows = [tuple(row) for row in cursor.fetchall()]
+                    results.append(pd.DataFrame.from_records(rows, columns=columns))
+                if not cursor.nextset():
+                    break
+            return results
+        except Exception as e:
+            logger.error(f"Batch execution failed: {e}")
+            logger.error(f"Query: {query}")
+            if params:
+                logger.error(f"Params: {params}")
+            raise
+        finally:
+            cursor.close()
+            
     def get_table_count(self, table_name: str, schema: str = "data") -> int:
         """
-        Get the number of rows in a table.
+        Get the number of rows in a table, as recorded in the partition metadata.
         
         Args:
             table_name: Name of the table
@@ -112,9 +207,35 @@ class RWMDatabase:
         Returns:
             Row count as an integer
         """
-        query = f"SELECT COUNT(*) AS count FROM [{schema}].[{table_name}]"
-        result = self.execute_query(query)
-        return result.iloc[0]['count']
+        # Read the row count from partition metadata instead of scanning the table
+        query = """
+        SELECT SUM(p.rows)
+        FROM sys.partitions p
+        INNER JOIN sys.objects o ON o.object_id = p.object_id
+        WHERE o.name = ? AND SCHEMA_NAME(o.schema_id) = ? AND p.index_id IN (0, 1)
+        """
+        cursor = self._prepare(query)
+        cursor.execute(query, table_name, schema)
+        count = cursor.fetchone()[0]
+        return int(count or 0)
+        
+    def _prepare(self, query: str) -> pyodbc.Cursor:
+        """
+        Get the cursor dedicated to a SQL statement, creating it on first use.
+        
+        Args:
+            query: SQL statement with ? parameter markers
+            
+        Returns:
+            Cursor to execute the statement on
+        """
+        cursor = self._prepared.get(query)
+        if cursor is None:
+            if not self.connection:
+                self.connect()
+            cursor = self.connection.cursor()
+            self._prepared[query] = cursor
+        return cursor
         
     def __enter__(self):
         """
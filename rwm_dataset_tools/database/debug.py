@@ -2,6 +2,7 @@
 Database debugging utilities.
 """
 import logging
+import textwrap
 import pandas as pd
 from typing import Dict, Any, List, Optional
 
@@ -9,6 +10,12 @@ from rwm_dataset_tools.database.connection import RWMDatabase
 
 logger = logging.getLogger(__name__)
 
+# Additional filtered row counts reported per table: (condition, description)
+FILTERED_COUNTS = {
+    'Images': ('IsDeleted = 0', 'Active images'),
+    'Annotations': ('UseForTraining = 1', 'Training annotations'),
+}
+
 class DatabaseDebugger:
     """
     Utility class for debugging database issues.
@@ -49,9 +56,8 @@ class DatabaseDebugger:
             
             # Log some key tables
             key_tables = tables[tables['TABLE_NAME'].isin(['Images', 'Annotations', 'AnnotationData', 'PlantInfo', 'Uploads'])]
-            logger.info("Key tables:")
-            for _, row in key_tables.iterrows():
-                logger.info(f"  {row['TABLE_SCHEMA']}.{row['TABLE_NAME']} ({row['COLUMN_COUNT']} columns)")
+            key_tables_str = key_tables[['TABLE_SCHEMA', 'TABLE_NAME', 'COLUMN_COUNT']].to_string(index=False)
+            logger.info(f"Key tables:\n{textwrap.indent(key_tables_str, '  ')}")
                 
             # Check key tables structure
             self._check_table_structure('Images')
@@ -60,10 +66,7 @@ class DatabaseDebugger:
             self._check_table_structure('PlantInfo')
             
             # Check table counts
-            self._check_table_count('Images')
-            self._check_table_count('Annotations')
-            self._check_table_count('AnnotationData')
-            self._check_table_count('PlantInfo')
+            self._check_table_counts(['Images', 'Annotations', 'AnnotationData', 'PlantInfo'])
             
             # Check for UseForTraining flag
             self._check_training_flags()
@@ -82,7 +85,7 @@ class DatabaseDebugger:
             table_name: Name of the table
             schema: Schema name (default: 'data')
         """
-        query = f"""
+        query = """
         SELECT 
             COLUMN_NAME, 
             DATA_TYPE, 
@@ -91,59 +94,64 @@ class DatabaseDebugger:
         FROM 
             INFORMATION_SCHEMA.COLUMNS
         WHERE 
-            TABLE_SCHEMA = '{schema}' AND TABLE_NAME = '{table_name}'
+            TABLE_SCHEMA = ? AND TABLE_NAME = ?
         ORDER BY 
             ORDINAL_POSITION
         """
         
         try:
-            columns = self.db.execute_query(query)
+            columns = self.db.execute_query(query, (schema, table_name))
             logger.info(f"Table {schema}.{table_name} structure ({len(columns)} columns):")
             
             # Only log a subset of columns for readability
             important_cols = ['Id', 'ImageId', 'UploadId', 'AnnotationId', 'PlantId', 'EPPOCode', 
                              'UseForTraining', 'IsDeleted', 'FileName', 'PolyData', 'MinX', 'MinY', 'MaxX', 'MaxY']
             
-            for col in important_cols:
-                col_info = columns[columns['COLUMN_NAME'] == col]
-                if not col_info.empty:
-                    col_row = col_info.iloc[0]
-                    logger.info(f"  {col_row['COLUMN_NAME']}: {col_row['DATA_TYPE']} (Nullable: {col_row['IS_NULLABLE']})")
+            important = (
+                columns.set_index('COLUMN_NAME')
+                .reindex(important_cols)
+                .dropna(subset=['DATA_TYPE'])
+            )
+            if not important.empty:
+                important_str = important[['DATA_TYPE', 'IS_NULLABLE']].rename_axis(None).to_string()
+                logger.info(textwrap.indent(important_str, '  '))
                     
         except Exception as e:
             logger.error(f"Error checking table structure for {schema}.{table_name}: {e}")
             
-    def _check_table_count(self, table_name: str, schema: str = 'data') -> None:
+    def _check_table_counts(self, table_names: List[str], schema: str = 'data') -> None:
         """
-        Check the row count of a table.
+        Check the row counts of several tables in a single query.
         
         Args:
-            table_name: Name of the table
+            table_names: Names of the tables
             schema: Schema name (default: 'data')
         """
-        query = f"SELECT COUNT(*) AS count FROM [{schema}].[{table_name}]"
+        queries = []
+        messages = []
+        for table_name in table_names:
+            # Total row counts come from the partition stats the engine maintains, not a table scan
+            queries.append(
+                f"SELECT {len(queries)} AS idx, SUM(row_count) AS count FROM sys.dm_db_partition_stats "
+                f"WHERE object_id = OBJECT_ID('[{schema}].[{table_name}]') AND index_id IN (0, 1)"
+            )
+            messages.append(f"Table {schema}.{table_name} contains {{}} rows")
+            
+            # For Images check how many are not deleted, for Annotations check UseForTraining
+            if table_name in FILTERED_COUNTS:
+                condition, description = FILTERED_COUNTS[table_name]
+                queries.append(f"SELECT {len(queries)}, COUNT_BIG(*) FROM [{schema}].[{table_name}] WHERE {condition}")
+                messages.append(f"  {description} ({condition}): {{}}")
+                
+        query = "\nUNION ALL\n".join(queries) + "\nORDER BY idx"
         
         try:
             result = self.db.execute_query(query)
-            count = result.iloc[0]['count']
-            logger.info(f"Table {schema}.{table_name} contains {count} rows")
-            
-            # For Images table, check how many are not deleted
-            if table_name == 'Images':
-                query = f"SELECT COUNT(*) AS count FROM [{schema}].[{table_name}] WHERE IsDeleted = 0"
-                result = self.db.execute_query(query)
-                active_count = result.iloc[0]['count']
-                logger.info(f"  Active images (IsDeleted = 0): {active_count}")
-                
-            # For Annotations table, check UseForTraining
-            if table_name == 'Annotations':
-                query = f"SELECT COUNT(*) AS count FROM [{schema}].[{table_name}] WHERE UseForTraining = 1"
-                result = self.db.execute_query(query)
-                training_count = result.iloc[0]['count']
-                logger.info(f"  Training annotations (UseForTraining = 1): {training_count}")
+            for message, count in zip(messages, result['count']):
+                logger.info(message.format(count))
                 
         except Exception as e:
-            logger.error(f"Error checking row count for {schema}.{table_name}: {e}")
+            logger.error(f"Error checking row counts for {schema} tables: {e}")
             
     def _check_training_flags(self) -> None:
         """
@@ -161,11 +169,8 @@ class DatabaseDebugger:
             """
             result = self.db.execute_query(query)
             
-            logger.info("UseForTraining flag distribution:")
-            for _, row in result.iterrows():
-                flag_value = row['UseForTraining']
-                count = row['count']
-                logger.info(f"  UseForTraining = {flag_value}: {count} annotations")
+            result_str = result[['UseForTraining', 'count']].to_string(index=False)
+            logger.info(f"UseForTraining flag distribution:\n{textwrap.indent(result_str, '  ')}")
                 
         except Exception as e:
             logger.error(f"Error checking UseForTraining flags: {e}")
@@ -175,34 +180,33 @@ class DatabaseDebugger:
         Check for "empty" annotations (missing key fields).
         """
         try:
+            # Missing bounding boxes and NULL EPPOCodes are counted in one query
             query = """
             SELECT 
-                COUNT(*) AS count
-            FROM 
-                [data].[AnnotationData]
-            WHERE 
-                (MinX IS NULL OR MinY IS NULL OR MaxX IS NULL OR MaxY IS NULL) 
-                AND AnnotationId IN (SELECT ImageId FROM [data].[Annotations] WHERE UseForTraining = 1)
+                (SELECT 
+                    COUNT(*)
+                FROM 
+                    [data].[AnnotationData] ad
+                WHERE 
+                    EXISTS (SELECT 1 FROM [data].[Annotations] anno WHERE anno.ImageId = ad.AnnotationId AND anno.UseForTraining = 1)
+                    AND (ad.MinX IS NULL OR ad.MinY IS NULL OR ad.MaxX IS NULL OR ad.MaxY IS NULL)
+                ) AS empty_count,
+                (SELECT 
+                    COUNT(*)
+                FROM 
+                    [data].[AnnotationData] ad
+                    LEFT JOIN [data].[PlantInfo] pi ON ad.PlantId = pi.Id
+                WHERE 
+                    EXISTS (SELECT 1 FROM [data].[Annotations] anno WHERE anno.ImageId = ad.AnnotationId AND anno.UseForTraining = 1)
+                    AND pi.EPPOCode IS NULL
+                ) AS null_eppo_count
             """
             result = self.db.execute_query(query)
-            empty_count = result.iloc[0]['count']
+            empty_count = result.iloc[0]['empty_count']
+            null_eppo_count = result.iloc[0]['null_eppo_count']
             
             logger.info(f"Found {empty_count} annotations marked for training with missing bounding box coordinates")
             
-            # Check for NULL EPPOCodes
-            query = """
-            SELECT 
-                COUNT(*) AS count
-            FROM 
-                [data].[AnnotationData] ad
-                LEFT JOIN [data].[PlantInfo] pi ON ad.PlantId = pi.Id
-            WHERE 
-                pi.EPPOCode IS NULL
-                AND ad.AnnotationId IN (SELECT ImageId FROM [data].[Annotations] WHERE UseForTraining = 1)
-            """
-            result = self.db.execute_query(query)
-            null_eppo_count = result.iloc[0]['count']
-            
             logger.info(f"Found {null_eppo_count} annotations marked for training with NULL EPPO codes")
             
         except Exception as e:
@@ -1,15 +1,20 @@
 """
 SQL queries and data fetching for the RWM database.
 """
+import json
+import numpy as np
 import pandas as pd
 import logging
 import time
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 
 from rwm_dataset_tools.database.connection import RWMDatabase
 
 logger = logging.getLogger(__name__)
 
+# Bounding box and image size columns, in pixels
+COORDINATE_COLUMNS = ['MinX', 'MinY', 'MaxX', 'MaxY', 'Width', 'Height']
+
 class RWMDataExtractor:
     """
     Class to extract annotation and image data from the RWM database.
@@ -31,23 +36,123 @@ class RWMDataExtractor:
         This query replicates the logic in the get_labled_data_annotation method.
         
         Returns:
-            DataFrame with annotation data
+            DataFrame with annotation data, sorted by image ID
+        """
+        chunks = list(self.iter_annotation_chunks())
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+        
+    def iter_annotation_chunks(self, chunksize: int = 50_000) -> Iterator[pd.DataFrame]:
+        """
+        Stream annotation data sorted by image ID, in chunks holding only complete images.
+        
+        Args:
+            chunksize: Number of rows fetched from the database at a time
+            
+        Yields:
+            DataFrames with the annotations of consecutive images
+        """
+        query, params = self._annotation_query()
+        
+        # First check that at least some data exists
+        try:
+            count_query = """
+            SELECT COUNT(*) AS count FROM [data].[Images]
+            INNER JOIN [data].[Annotations] ON ([data].[Annotations].[ImageId] = [data].[Images].[Id])
+            WHERE [data].[Images].[IsDeleted] = 0
+            AND [data].[Annotations].[UseForTraining] = 1
+            """
+            count_result = self.db.execute_query(count_query)
+            img_count = count_result.iloc[0]['count']
+            logger.info(f"Found {img_count} images with UseForTraining=1 in the database")
+            
+            if img_count == 0:
+                logger.error("No images with UseForTraining=1 found in database!")
+                logger.error("Cannot extract dataset without training images.")
+                return
+        except Exception as e:
+            logger.error(f"Error checking for training images: {e}")
+            # Continue and try the main query anyway
+        
+        logger.info("Streaming annotation data from database...")
+        try:
+            start_time = time.time()
+            fetched = 0
+            carry = None
+            
+            # Sort on the server so every image arrives as one contiguous run of rows
+            ordered_query = query + "        ORDER BY img.[Id], ad.[Id]\n"
+            for chunk in self.db.execute_query_chunks(ordered_query, params, chunksize):
+                # EPPO codes are padded in the database; strip them client-side in one vectorized pass
+                chunk['EPPOCode'] = chunk['EPPOCode'].str.strip()
+                
+                # Pixel coordinates are exact in float32, at half the memory of float64
+                chunk[COORDINATE_COLUMNS] = chunk[COORDINATE_COLUMNS].astype(np.float32)
+                fetched += len(chunk)
+                if carry is not None and len(carry) > 0:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                    
+                # The last image may continue in the next chunk; hold its rows back
+                image_ids = chunk['ImageId'].to_numpy()
+                boundary = int(np.searchsorted(image_ids, image_ids[-1], side='left'))
+                carry = chunk.iloc[boundary:]
+                if boundary > 0:
+                    yield chunk.iloc[:boundary]
+                    
+            if carry is not None and len(carry) > 0:
+                yield carry
+            elapsed = time.time() - start_time
+        except Exception as e:
+            logger.error(f"Error executing annotation query: {e}")
+            logger.error("Make sure the database schema matches what the query expects")
+            raise
+            
+        if fetched == 0:
+            logger.error("Query returned zero annotations! Check database content.")
+            # Try to get more information about why the query returned no data
+            logger.error("Checking AnnotationData table...")
+            self.db.execute_query("SELECT TOP 10 Id, AnnotationId FROM [data].[AnnotationData]")
+            logger.error("Checking Annotations table...")
+            self.db.execute_query("SELECT TOP 10 ImageId, UseForTraining FROM [data].[Annotations]")
+            return
+            
+        logger.info(f"Fetched {fetched} annotation records in {elapsed:.2f} seconds")
+        
+        # Let the server aggregate the summary statistics instead of counting them across chunks
+        summary, eppo_counts = self._get_summary_statistics(query, params)
+        logger.info(f"Data includes {summary.iloc[0]['image_count']} unique images and {summary.iloc[0]['eppo_count']} unique EPPO codes")
+        
+        # Log most common EPPO codes for verification
+        logger.info("Most common EPPO codes in the dataset:")
+        for eppo, count in zip(eppo_counts['EPPOCode'].str.strip(), eppo_counts['count']):
+            logger.info(f"  {eppo}: {count} annotations")
+            
+    def _annotation_query(self) -> Tuple[str, Tuple[str, str]]:
+        """
+        Build the annotation query and its parameters.
+        
+        Returns:
+            Tuple of (SQL query, query parameters)
         """
         # Define blacklist plant IDs - typically these would come from configuration
         blacklist_plant_ids = [-12, -7, 0, 148, 150, 151, 994]  # Same as in blacklist_plant_ids_annotation.csv
         
-        # Format the blacklist for SQL
-        blacklist_str = ', '.join(str(id) for id in blacklist_plant_ids)
+        # Images to exclude from the dataset
+        held_back_images = self.config['dataset'].get('held_back_images', [])
+        
+        # Both ID lists are passed as JSON array parameters and expanded server-side,
+        # so the query text (and its cached plan) does not change with the lists
+        params = (json.dumps(blacklist_plant_ids), json.dumps(held_back_images))
+        logger.info(f"Excluding {len(blacklist_plant_ids)} blacklisted plant IDs and {len(held_back_images)} held back images")
         
         # Build the query - this replicates the logic in rwm_db.get_labled_data_annotation()
-        query = f"""
+        query = """
         SELECT
-            [data].[AnnotationData].[Id],
+            ad.[Id],
             [UploadId],
             [FileName],
             [ImageId],
             [PlantId],
-            TRIM([data].[PlantInfo].[EPPOCode]) AS EPPOCode,
+            pi.[EPPOCode],
             [NameEnglish],
             [GrowthStage],
             [Width],
@@ -65,72 +170,50 @@ class RWMDataExtractor:
             [GrownWeed],
             [cotyledon]
          FROM
-            [data].[Images]
-            INNER JOIN [data].[Annotations] ON ([data].[Annotations].[ImageId] = [data].[Images].[Id])
-            LEFT JOIN [data].[AnnotationData] ON ([data].[AnnotationData].[AnnotationId] = [data].[Images].[Id])
-            LEFT JOIN [data].[PlantInfo] ON ([AnnotationData].[PlantId] = [data].[PlantInfo].[Id])
-            LEFT JOIN [data].[Uploads]  ON ([data].[Images].[UploadId] = [data].[Uploads].[Id])
+            [data].[Images] img
+            INNER JOIN [data].[Annotations] a ON (a.[ImageId] = img.[Id])
+            INNER JOIN [data].[Uploads] u ON (u.[Id] = img.[UploadId] AND u.[IsDeleted] = 0)
+            LEFT JOIN [data].[AnnotationData] ad ON (ad.[AnnotationId] = img.[Id])
+            LEFT JOIN [data].[PlantInfo] pi ON (ad.[PlantId] = pi.[Id])
          WHERE
-            [data].[Images].[IsDeleted] = 0
-            AND [data].[Uploads].[IsDeleted] = 0
-            AND ([data].[AnnotationData].IsTemporary = 0 OR [data].[AnnotationData].IsTemporary is NULL)
-            AND [data].[Annotations].[UseForTraining] = 1
-            AND [data].[AnnotationData].[PlantId] NOT IN ({blacklist_str})
+            img.[IsDeleted] = 0
+            AND (ad.IsTemporary = 0 OR ad.IsTemporary is NULL)
+            AND a.[UseForTraining] = 1
+            AND ad.[PlantId] NOT IN (SELECT [Id] FROM OPENJSON(?) WITH ([Id] INT '$'))
+            AND img.[Id] NOT IN (SELECT [Id] FROM OPENJSON(?) WITH ([Id] INT '$'))
         """
         
         # Log the actual query for debugging
         logger.debug("SQL Query for fetching annotations:")
         logger.debug(query)
         
-        # First check that at least some data exists
-        try:
-            count_query = """
-            SELECT COUNT(*) AS count FROM [data].[Images]
-            INNER JOIN [data].[Annotations] ON ([data].[Annotations].[ImageId] = [data].[Images].[Id])
-            WHERE [data].[Images].[IsDeleted] = 0
-            AND [data].[Annotations].[UseForTraining] = 1
-            """
-            count_result = self.db.execute_query(count_query)
-            img_count = count_result.iloc[0]['count']
-            logger.info(f"Found {img_count} images with UseForTraining=1 in the database")
-            
-            if img_count == 0:
-                logger.error("No images with UseForTraining=1 found in database!")
-                logger.error("Cannot extract dataset without training images.")
-                return pd.DataFrame()
-        except Exception as e:
-            logger.error(f"Error checking for training images: {e}")
-            # Continue and try the main query anyway
+        return query, params
         
-        logger.info("Fetching annotation data from database...")
-        try:
-            start_time = time.time()
-            data = self.db.execute_query(query)
-            elapsed = time.time() - start_time
-            
-            if len(data) == 0:
-                logger.error("Query returned zero annotations! Check database content.")
-                # Try to get more information about why the query returned no data
-                logger.error("Checking AnnotationData table...")
-                self.db.execute_query("SELECT TOP 10 Id, AnnotationId FROM [data].[AnnotationData]")
-                logger.error("Checking Annotations table...")
-                self.db.execute_query("SELECT TOP 10 ImageId, UseForTraining FROM [data].[Annotations]")
-            else:
-                logger.info(f"Fetched {len(data)} annotation records in {elapsed:.2f} seconds")
-                logger.info(f"Data includes {data['ImageId'].nunique()} unique images and {data['EPPOCode'].nunique()} unique EPPO codes")
-                
-                # Log most common EPPO codes for verification
-                logger.info("Most common EPPO codes in the dataset:")
-                eppo_counts = data['EPPOCode'].value_counts().head(10)
-                for eppo, count in eppo_counts.items():
-                    logger.info(f"  {eppo}: {count} annotations")
-            
-            return data
+    def _get_summary_statistics(self, query: str, params: Tuple) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Aggregate image/EPPO counts and the most common EPPO codes on the server.
+        
+        Args:
+            query: Annotation query to summarize
+            params: Parameters of the annotation query
             
-        except Exception as e:
-            logger.error(f"Error executing annotation query: {e}")
-            logger.error("Make sure the database schema matches what the query expects")
-            raise
+        Returns:
+            Tuple of (one-row frame with image_count and eppo_count, top 10 EPPOCode counts)
+        """
+        summary_query = f"""
+        WITH annotations AS ({query})
+        SELECT COUNT(DISTINCT ImageId) AS image_count, COUNT(DISTINCT EPPOCode) AS eppo_count
+        FROM annotations;
+        
+        WITH annotations AS ({query})
+        SELECT TOP 10 EPPOCode, COUNT(*) AS count
+        FROM annotations
+        WHERE EPPOCode IS NOT NULL
+        GROUP BY EPPOCode
+        ORDER BY count DESC;
+        """
+        summary, eppo_counts = self.db.execute_batch(summary_query, params * 2)
+        return summary, eppo_counts
         
     def filter_held_back_images(self, data: pd.DataFrame) -> pd.DataFrame:
         """
@@ -170,6 +253,19 @@ class RWMDataExtractor:
         result = self.db.execute_query(query)
         return dict(zip(result['ImageId'], result['UploadId']))
         
+    def get_upload_dir(self, upload_id: int) -> str:
+        """
+        Get the directory holding the images of an upload.
+        
+        Args:
+            upload_id: Upload ID
+            
+        Returns:
+            Full path to the upload directory
+        """
+        rwm_data_path = self.config['paths']['rwm_data']
+        return f"{rwm_data_path}/{upload_id}"
+        
     def get_image_path(self, upload_id: int, filename: str) -> str:
         """
         Get the full path to an image.
@@ -181,5 +277,4 @@ class RWMDataExtractor:
         Returns:
             Full path to the image
         """
-        rwm_data_path = self.config['paths']['rwm_data']
-        return f"{rwm_data_path}/{upload_id}/{filename}"
\ No newline at end of file
+        return f"{self.get_upload_dir(upload_id)}/{filename}"
\ No newline at end of file
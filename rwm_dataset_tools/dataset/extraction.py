@@ -3,18 +3,29 @@ Dataset extraction from RWM database to YOLO format.
 """
 import os
 import time
+import queue
 import logging
+import threading
 import numpy as np
 import pandas as pd
-from typing import Dict, Any, List, Optional, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from typing import Dict, Any, FrozenSet, Iterator, List, Optional, Tuple
 from tqdm import tqdm
 
 from rwm_dataset_tools.database.connection import RWMDatabase
 from rwm_dataset_tools.database.queries import RWMDataExtractor
-from rwm_dataset_tools.dataset.processing import partition_by_image_id, process_psez_annotations, determine_dataset_split
+from rwm_dataset_tools.dataset.processing import partition_by_image_id, process_psez_annotations, assign_dataset_splits
 
 logger = logging.getLogger(__name__)
 
+# Threads creating image and label files; the work is file system bound and releases the GIL
+DEFAULT_IMAGE_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+# Annotation chunks fetched and filtered ahead of the file creation. Besides the queued
+# chunks, one is being filtered by the producer, one is being submitted and one is still
+# being written, so at most PREFETCH_CHUNKS + 3 chunks are held in memory
+PREFETCH_CHUNKS = 4
+
 class DatasetExtractor:
     """
     Extract dataset from RWM database and prepare it in the required format.
@@ -36,6 +47,14 @@ class DatasetExtractor:
         self.random_seed = config.get('random_seed', 42)
         self.rng = np.random.RandomState(self.random_seed)
         
+        # Fixed upload/image sets as frozensets for constant-time membership tests
+        self.fixed_sets = {
+            name: frozenset(ids) for name, ids in config['dataset']['fixed_sets'].items()
+        }
+        
+        # Number of images processed in parallel
+        self.num_workers = config['dataset'].get('num_workers', DEFAULT_IMAGE_WORKERS)
+        
     def extract(self) -> Dict[str, int]:
         """
         Extract dataset from RWM database and prepare it in the required format.
@@ -48,40 +67,18 @@ class DatasetExtractor:
         # Connect to the database
         with self.db:
             try:
-                # Get annotation data
-                logger.info("Fetching annotation data from database...")
+                # Stream the annotations image by image; each chunk is filtered and written
+                # while the next one is fetched
+                logger.info("Creating dataset files...")
                 start_time = time.time()
-                data = self.data_extractor.get_annotation_data()
+                stats = self._create_dataset_files(self.data_extractor.iter_annotation_chunks())
                 elapsed = time.time() - start_time
-                logger.info(f"Fetched {len(data)} annotations in {elapsed:.2f} seconds")
                 
-                if len(data) == 0:
+                if stats['total_images'] == 0:
                     logger.error("No annotations found! Check SQL query and database content.")
                     logger.error("Ensure 'UseForTraining' flag is set for images in the database.")
                     return {"error": "No annotations found"}
-                
-                # Show sample of data
-                logger.info("Sample annotation data:")
-                sample_data = data.head(3)
-                for i, row in sample_data.iterrows():
-                    logger.info(f"  Image: {row['ImageId']}, Upload: {row['UploadId']}, EPPO: {row['EPPOCode']}")
-                
-                # Filter out held back images
-                logger.info("Filtering out held back images...")
-                data = self.data_extractor.filter_held_back_images(data)
-                
-                # Process PSEZ annotations
-                logger.info("Processing PSEZ annotations...")
-                data = process_psez_annotations(data, self.config['dataset']['psez_crops'])
-                
-                # Partition data by image ID
-                logger.info("Partitioning data by image ID...")
-                data_by_image = partition_by_image_id(data)
-                logger.info(f"Dataset contains {len(data_by_image)} unique images")
-                
-                # Create dataset files
-                logger.info("Creating dataset files...")
-                stats = self._create_dataset_files(data_by_image)
+                logger.info(f"Processed {stats['total_images']} images in {elapsed:.2f} seconds")
                 
                 # Create dataset YAML file
                 logger.info("Creating dataset YAML file...")
@@ -96,19 +93,19 @@ class DatasetExtractor:
                 logger.error(traceback.format_exc())
                 raise
         
-    def _create_dataset_files(self, data_by_image: Dict[int, pd.DataFrame]) -> Dict[str, int]:
+    def _create_dataset_files(self, chunks: Iterator[pd.DataFrame]) -> Dict[str, int]:
         """
         Create dataset files (images and labels) for each image.
         
         Args:
-            data_by_image: Dictionary mapping image IDs to DataFrames with annotations
+            chunks: Annotation data sorted by image ID, in chunks holding only complete images
             
         Returns:
             Dictionary with statistics about the created files
         """
         # Initialize statistics
         stats = {
-            'total_images': len(data_by_image),
+            'total_images': 0,
             'train_images': 0,
             'val_images': 0,
             'test_images': 0,
@@ -120,66 +117,86 @@ class DatasetExtractor:
             'errors': 0
         }
         
-        # Process each image
-        logger.info(f"Creating dataset files for {len(data_by_image)} images")
-        
-        # Use tqdm with a format that shows more information
+        # Use tqdm with a format that shows more information; the total is unknown while streaming
         progress_bar = tqdm(
-            data_by_image.items(), 
             desc="Processing images",
             ncols=100,
-            bar_format="{l_bar}{bar}| {n_fmt}/{total_fmt} [{elapsed}<{remaining}, {rate_fmt}]"
+            mininterval=0.5,
+            bar_format="{desc}: {n_fmt} images [{elapsed}, {rate_fmt}]"
         )
         
-        for image_id, annotations in progress_bar:
-            try:
-                # Update progress description with current image
-                progress_bar.set_description(f"Processing image {image_id}")
-                
-                # Determine dataset split
-                split = determine_dataset_split(annotations, self.config, self.rng)
-                
-                # Get image path
-                row = annotations.iloc[0]
-                upload_id = row['UploadId']
-                filename = row['FileName']
-                
-                # Get full image path
-                source_path = self.data_extractor.get_image_path(upload_id, filename)
-                
-                # Check if source image exists
-                if not os.path.exists(source_path):
-                    logger.warning(f"Image not found: {source_path} (UploadId: {upload_id}, ImageId: {image_id})")
-                    stats['skipped_images'] += 1
-                    continue
-                
-                # Create image symlink
-                try:
-                    self.format_handler.create_image_file(source_path, image_id, split)
-                except Exception as e:
-                    logger.warning(f"Failed to create file for image {image_id}: {e}")
-                    stats['errors'] += 1
-                    continue
-                
-                # Create label file
-                try:
-                    self.format_handler.create_label_file(annotations, image_id, split)
-                except Exception as e:
-                    logger.warning(f"Failed to create label file for image {image_id}: {e}")
-                    stats['errors'] += 1
-                    continue
-                
-                # Update statistics
-                stats[f'{split}_images'] += 1
-                stats[f'{split}_annotations'] += len(annotations)
-                stats['total_annotations'] += len(annotations)
+        # Number of annotations per image counted in a split, until its background file creation is confirmed
+        completed = {}
+        
+        # Fetch and filter annotations on a separate thread, so database waits overlap with file creation
+        chunk_queue = queue.Queue(maxsize=PREFETCH_CHUNKS)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce_chunks, 
+            args=(chunks, chunk_queue, stop), 
+            name='annotation-fetch', 
+            daemon=True
+        )
+        producer.start()
+        
+        try:
+            with ThreadPoolExecutor(max_workers=self.num_workers, thread_name_prefix='image') as executor:
+                upload_files = {}
+                pending = {}
                 
-                # Log occasional progress details
-                if image_id % 100 == 0:
-                    logger.debug(f"Processed image {image_id} ({len(annotations)} annotations, split: {split})")
+                while True:
+                    item = chunk_queue.get()
+                    if item is None:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    data, image_ranges = item
                     
-            except Exception as e:
-                logger.error(f"Error processing image {image_id}: {e}")
+                    # Chunks arrive in image ID order, so the random splits match a single pass over all images
+                    image_rows = data.iloc[[start for _, start, _ in image_ranges]]
+                    splits = assign_dataset_splits(image_rows, self.config, self.rng, self.fixed_sets)
+                    
+                    # List every upload directory once instead of checking each image path
+                    chunk_uploads = data['UploadId'].unique().tolist()
+                    new_uploads = [upload_id for upload_id in chunk_uploads if upload_id not in upload_files]
+                    if new_uploads:
+                        upload_files.update(self._scan_upload_dirs(new_uploads, executor))
+                        
+                    # Workers of the previous chunk may still be reading; give this chunk its own mapping
+                    existing_files = {upload_id: upload_files[upload_id] for upload_id in chunk_uploads}
+                    
+                    # Finish the previous chunk before submitting this one, so the pool holds at most one chunk
+                    self._collect_results(pending, stats, progress_bar, completed)
+                    
+                    # Each image gets a slice of the sorted data, not a copy
+                    pending = {
+                        executor.submit(
+                            self._process_image, image_id, data.iloc[start:stop], splits[image_id], existing_files
+                        ): image_id
+                        for image_id, start, stop in image_ranges
+                    }
+                    stats['total_images'] += len(pending)
+                    
+                self._collect_results(pending, stats, progress_bar, completed)
+        finally:
+            # Unblock the producer if extraction stopped early
+            stop.set()
+            producer.join()
+            progress_bar.close()
+        
+        # Wait for image copies and batched file writes still running in the background, and
+        # move the images whose files failed from their split to the errors
+        failed_images = self.format_handler.wait_for_image_files()
+        if failed_images:
+            logger.warning(f"Failed to create the image or label file of {len(failed_images)} images")
+            for image_id, split in failed_images:
+                # Images that already failed in _process_image are counted as errors
+                if image_id not in completed:
+                    continue
+                num_annotations = completed.pop(image_id)
+                stats[f'{split}_images'] -= 1
+                stats[f'{split}_annotations'] -= num_annotations
+                stats['total_annotations'] -= num_annotations
                 stats['errors'] += 1
         
         # Log summary of skipped images
@@ -190,4 +207,169 @@ class DatasetExtractor:
         if stats['errors'] > 0:
             logger.warning(f"Encountered {stats['errors']} errors during dataset creation")
         
-        return stats
\ No newline at end of file
+        return stats
+        
+    def _produce_chunks(
+        self, 
+        chunks: Iterator[pd.DataFrame], 
+        chunk_queue: queue.Queue, 
+        stop: threading.Event
+    ) -> None:
+        """
+        Filter PSEZ annotations and partition each chunk by image ID, ahead of the file creation.
+        
+        Puts (data, image_ranges) tuples on the queue, then None when done or the exception that stopped it.
+        
+        Args:
+            chunks: Annotation data sorted by image ID, in chunks holding only complete images
+            chunk_queue: Bounded queue read by _create_dataset_files
+            stop: Event set when the consumer no longer reads the queue
+        """
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    chunk_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+            
+        try:
+            first_chunk = True
+            
+            for data in chunks:
+                # Show sample of data
+                if first_chunk:
+                    logger.info("Sample annotation data:")
+                    sample_data = data.head(3)[['ImageId', 'UploadId', 'EPPOCode']]
+                    for image_id, upload_id, eppo_code in sample_data.itertuples(index=False, name=None):
+                        logger.info(f"  Image: {image_id}, Upload: {upload_id}, EPPO: {eppo_code}")
+                    first_chunk = False
+                
+                # PSEZ filtering only compares annotations within an image, so it works per chunk
+                data = process_psez_annotations(data, self.config['dataset']['psez_crops'])
+                if not put(partition_by_image_id(data)):
+                    return
+                    
+            put(None)
+        except Exception as e:
+            put(e)
+            
+    def _collect_results(
+        self, 
+        futures: Dict[Future, int], 
+        stats: Dict[str, int], 
+        progress_bar: tqdm, 
+        completed: Dict[int, int]
+    ) -> None:
+        """
+        Wait for submitted images and add their results to the statistics.
+        
+        Args:
+            futures: Dictionary mapping futures from _process_image to their image IDs
+            stats: Statistics to update
+            progress_bar: Progress bar advanced once per image
+            completed: Number of annotations per counted image, updated with the new ones
+        """
+        # Only this thread updates the statistics
+        for future in as_completed(futures):
+            image_id = futures[future]
+            progress_bar.update(1)
+            
+            try:
+                split, num_annotations, status = future.result()
+            except Exception as e:
+                logger.error(f"Error processing image {image_id}: {e}")
+                stats['errors'] += 1
+                continue
+                
+            if status == 'skipped':
+                stats['skipped_images'] += 1
+            elif status == 'error':
+                stats['errors'] += 1
+            else:
+                # Update statistics
+                stats[f'{split}_images'] += 1
+                stats[f'{split}_annotations'] += num_annotations
+                stats['total_annotations'] += num_annotations
+                completed[image_id] = num_annotations
+                
+    def _scan_upload_dirs(self, upload_ids: List[int], executor: ThreadPoolExecutor) -> Dict[int, FrozenSet[str]]:
+        """
+        List the files in the directories of the given uploads.
+        
+        Args:
+            upload_ids: Upload IDs to scan
+            executor: Thread pool used to scan the directories in parallel
+            
+        Returns:
+            Dictionary mapping each upload ID to the names of the files in its directory
+        """
+        def scan(upload_id: int) -> FrozenSet[str]:
+            try:
+                with os.scandir(self.data_extractor.get_upload_dir(upload_id)) as entries:
+                    return frozenset(entry.name for entry in entries)
+            except FileNotFoundError:
+                return frozenset()
+            except OSError as e:
+                logger.warning(f"Failed to list upload directory for UploadId {upload_id}: {e}")
+                return frozenset()
+                
+        logger.info(f"Scanning {len(upload_ids)} upload directories...")
+        return dict(zip(upload_ids, executor.map(scan, upload_ids)))
+        
+    def _process_image(
+        self, 
+        image_id: int, 
+        annotations: pd.DataFrame, 
+        split: str, 
+        existing_files: Dict[int, FrozenSet[str]]
+    ) -> Tuple[str, int, str]:
+        """
+        Create the image and label file for a single image.
+        
+        Args:
+            image_id: Image ID
+            annotations: DataFrame with annotations for the image
+            split: Dataset split ('train', 'val', or 'test')
+            existing_files: File names per upload ID, from _scan_upload_dirs
+            
+        Returns:
+            Tuple of (split, number of annotations, status), with status 'ok', 'skipped' or 'error'
+        """
+        # Get image path
+        row = annotations.iloc[0]
+        upload_id = row['UploadId']
+        filename = row['FileName']
+        
+        # Get full image path
+        source_path = self.data_extractor.get_image_path(upload_id, filename)
+        
+        # Check if source image exists; file names with a directory part were not listed
+        if '/' in filename:
+            exists = os.path.exists(source_path)
+        else:
+            exists = filename in existing_files.get(upload_id, ())
+        if not exists:
+            logger.warning(f"Image not found: {source_path} (UploadId: {upload_id}, ImageId: {image_id})")
+            return split, len(annotations), 'skipped'
+        
+        # Create image symlink
+        try:
+            self.format_handler.create_image_file(source_path, image_id, split)
+        except Exception as e:
+            logger.warning(f"Failed to create file for image {image_id}: {e}")
+            return split, len(annotations), 'error'
+        
+        # Create label file
+        try:
+            self.format_handler.create_label_file(annotations, image_id, split)
+        except Exception as e:
+            logger.warning(f"Failed to create label file for image {image_id}: {e}")
+            return split, len(annotations), 'error'
+        
+        # Log occasional progress details
+        if image_id % 100 == 0 and logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Processed image %s (%d annotations, split: %s)", image_id, len(annotations), split)
+            
+        return split, len(annotations), 'ok'
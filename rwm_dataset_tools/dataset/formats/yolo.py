@@ -2,17 +2,46 @@
 Base YOLO format handler for dataset creation.
 """
 import os
+import errno
 import yaml
 import logging
+import threading
 import pandas as pd
 import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from typing import Dict, Any, List, Optional, Tuple, TextIO
 
 from rwm_dataset_tools.dataset.processing import find_relevant_eppo
-from rwm_dataset_tools.utils.path import create_directory, create_symlink
+from rwm_dataset_tools.utils.path import (
+    DEFAULT_COPY_WORKERS, copy_files, create_directory, create_hardlink, create_symlink, get_file_extension
+)
+from rwm_dataset_tools.utils.uring import UringBatchWriter, uring_available
 
 logger = logging.getLogger(__name__)
 
+# Number of image copies handed to a copy worker at once
+COPY_BATCH_SIZE = 64
+
+# YOLO label line: class index and normalized center x, center y, width, height
+LABEL_FORMAT = "%d %.6f %.6f %.6f %.6f"
+
+# Use the libyaml emitter when PyYAML was built with it
+_YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
+
+@lru_cache(maxsize=256)
+def _label_template(num_rows: int) -> str:
+    """
+    Get the format string for a label file with the given number of lines.
+    
+    Args:
+        num_rows: Number of annotations in the label file
+        
+    Returns:
+        LABEL_FORMAT repeated once per line, each line ending with a newline
+    """
+    return (LABEL_FORMAT + '\n') * num_rows
+
 class YOLOFormatBase:
     """
     Base class for YOLO format dataset creation.
@@ -28,6 +57,31 @@ class YOLOFormatBase:
         self.output_dir = os.path.expanduser(config['dataset']['output_dir'])
         self.eppo_codes = config['dataset']['eppo_codes']
         
+        # Class index per EPPO code, and per raw database code once it has been resolved
+        self._eppo_index = {eppo_code: i for i, eppo_code in enumerate(self.eppo_codes)}
+        self._eppo_class_cache = {}
+        
+        # EPPO codes longest first, so prefix matching picks the most specific code
+        self._prefixes = tuple(sorted(self.eppo_codes, key=len, reverse=True))
+        
+        # How images are placed in the dataset: 'symlink', 'hardlink' or 'copy'
+        default_link_mode = 'copy' if config['dataset'].get('copy_images', False) else 'symlink'
+        self.link_mode = config['dataset'].get('link_mode', default_link_mode)
+        self._link_mode_lock = threading.Lock()
+        
+        # Image copies run in batches on a worker pool, with a bounded number of batches in flight
+        self.copy_workers = config['dataset'].get('copy_workers', DEFAULT_COPY_WORKERS)
+        self._copy_executor = None
+        self._copy_batch = []
+        self._copy_batch_lock = threading.Lock()
+        self._copy_slots = threading.BoundedSemaphore(self.copy_workers * 2)
+        self._copy_lock = threading.Lock()
+        self._failed_paths = []
+        
+        # Symlinks, label files and copies are submitted to io_uring in batches if enabled and available
+        self.use_io_uring = config['dataset'].get('use_io_uring', False) and uring_available()
+        self._batch_writer = None
+        
         # Create the directory structure
         self._create_directory_structure()
         
@@ -68,6 +122,12 @@ class YOLOFormatBase:
         create_directory(self.val_labels_path)
         create_directory(self.test_labels_path)
         
+        # Split of each image and label directory, to map failed files back to their image
+        self._split_by_dir = {
+            self.train_images_path: 'train', self.val_images_path: 'val', self.test_images_path: 'test',
+            self.train_labels_path: 'train', self.val_labels_path: 'val', self.test_labels_path: 'test',
+        }
+        
     def get_split_paths(self, split: str) -> Tuple[str, str]:
         """
         Get the paths for a specific dataset split.
@@ -89,7 +149,7 @@ class YOLOFormatBase:
             
     def create_image_file(self, source_path: str, image_id: int, split: str) -> str:
         """
-        Create a link to an image in the dataset, either as symlink or copy.
+        Create a link to an image in the dataset, as symlink, hardlink or copy.
         
         Args:
             source_path: Path to the source image
@@ -103,77 +163,135 @@ class YOLOFormatBase:
         images_dir, _ = self.get_split_paths(split)
         
         # Get the extension from the source path
-        _, ext = os.path.splitext(source_path)
+        ext = get_file_extension(source_path)
         
         # Create the destination path
         dest_path = os.path.join(images_dir, f"{image_id}{ext}")
         
-        # Create the link (symlink or copy)
-        if self.config['dataset'].get('copy_images', False):
-            from shutil import copyfile
-            # Create parent directory if it doesn't exist
-            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-            if not os.path.exists(dest_path):
-                try:
-                    copyfile(source_path, dest_path)
-                    logger.debug(f"Copied: {source_path} -> {dest_path}")
-                except Exception as e:
-                    logger.error(f"Failed to copy file: {e}")
+        # Create the link (symlink, hardlink or copy)
+        if self.link_mode == 'copy':
+            # Copies finish in the background; see wait_for_image_files()
+            self._submit_copy(source_path, dest_path)
+        elif self.link_mode == 'hardlink':
+            try:
+                create_hardlink(source_path, dest_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
                     raise
+                # Hard links can't cross file systems; use symlinks for the rest of the run.
+                # Several workers may hit this at once, so only the first one switches and warns
+                with self._link_mode_lock:
+                    if self.link_mode == 'hardlink':
+                        logger.warning(f"Cannot hardlink across file systems ({source_path}), falling back to symlinks")
+                        self.link_mode = 'symlink'
+                create_symlink(source_path, dest_path)
+        elif self.use_io_uring:
+            # Created with the next io_uring batch; see wait_for_image_files(). The target is
+            # stored as given, so make it absolute like create_symlink does
+            self._get_batch_writer().symlink(os.path.abspath(source_path), dest_path)
         else:
             create_symlink(source_path, dest_path)
         
         return dest_path
-    def row_to_yolo_format(self, row: Dict[str, Any]) -> Optional[str]:
+        
+    def _submit_copy(self, source_path: str, dest_path: str) -> None:
         """
-        Convert a row of annotation data to YOLO format.
+        Queue an image copy, handing a full batch to the copy worker pool.
         
         Args:
-            row: Dictionary with annotation data
+            source_path: Path to the source image
+            dest_path: Path to the destination image
+        """
+        # Images may be created from several threads; the batch is shared
+        with self._copy_batch_lock:
+            self._copy_batch.append((source_path, dest_path))
+            if len(self._copy_batch) >= COPY_BATCH_SIZE:
+                self._flush_copies()
             
-        Returns:
-            YOLO format string or None if the annotation should be skipped
+    def _flush_copies(self) -> None:
+        """
+        Submit the queued image copies to the copy worker pool. Callers must hold _copy_batch_lock.
+        """
+        if not self._copy_batch:
+            return
+            
+        if self._copy_executor is None:
+            self._copy_executor = ThreadPoolExecutor(max_workers=self.copy_workers, thread_name_prefix='copy')
+            
+        # Block while too many batches are pending, so the queue doesn't grow with the dataset
+        batch, self._copy_batch = self._copy_batch, []
+        self._copy_slots.acquire()
+        future = self._copy_executor.submit(copy_files, batch, self.use_io_uring)
+        future.add_done_callback(lambda f: self._copy_done(f, batch))
+        
+    def _copy_done(self, future: Future, batch: List[Tuple[str, str]]) -> None:
         """
-        eppo_code = row['EPPOCode']
-        cotyledon_id = row['cotyledon']
+        Release the batch slot and record failed copies.
         
-        # Skip if no EPPO code
-        if pd.isna(eppo_code):
-            return None
+        Args:
+            future: Completed copy_files future
+            batch: List of (source_path, dest_path) copied by the future
+        """
+        self._copy_slots.release()
+        try:
+            failures = future.result()
+        except Exception as e:
+            logger.error(f"Failed to copy batch of {len(batch)} files: {e}")
+            failed_paths = [dest_path for _, dest_path in batch]
+        else:
+            for source_path, dest_path, error in failures:
+                logger.error(f"Failed to copy file {source_path} -> {dest_path}: {error}")
+            failed_paths = [dest_path for _, dest_path, _ in failures]
             
-        # Find the relevant EPPO code
-        eppo_code = find_relevant_eppo(eppo_code, cotyledon_id, self.eppo_codes)
-        if eppo_code is None:
-            return None
+        if failed_paths:
+            with self._copy_lock:
+                self._failed_paths.extend(failed_paths)
+                
+    def _get_batch_writer(self) -> UringBatchWriter:
+        """
+        Get the io_uring batch writer, creating it on first use.
+        
+        Returns:
+            Batch writer for symlinks and label files
+        """
+        with self._copy_lock:
+            if self._batch_writer is None:
+                self._batch_writer = UringBatchWriter()
+            return self._batch_writer
             
-        # Get the class index
-        class_index = self.eppo_codes.index(eppo_code)
-        
-        # Get bounding box coordinates
-        min_x = row['MinX']
-        min_y = row['MinY']
-        max_x = row['MaxX']
-        max_y = row['MaxY']
-        image_width = row['Width']
-        image_height = row['Height']
-        
-        # Calculate box dimensions
-        box_width = max_x - min_x
-        box_height = max_y - min_y
+    def wait_for_image_files(self) -> List[Tuple[int, str]]:
+        """
+        Wait until all queued image copies and batched symlinks/label files have finished.
         
-        # Calculate box center
-        center_x = float(box_width) / 2 + min_x
-        center_y = float(box_height) / 2 + min_y
+        Returns:
+            List of (image_id, split) for the images whose image or label file failed since the last call
+        """
+        with self._copy_batch_lock:
+            self._flush_copies()
+        if self._copy_executor is not None:
+            self._copy_executor.shutdown(wait=True)
+            self._copy_executor = None
+            
+        failures = []
+        if self._batch_writer is not None:
+            failures = self._batch_writer.close()
+            self._batch_writer = None
+            for path, error in failures:
+                logger.error(f"Failed to create file {path}: {error}")
+            
+        with self._copy_lock:
+            failed_paths, self._failed_paths = self._failed_paths, []
+        failed_paths.extend(path for path, _ in failures)
         
-        # Normalize coordinates
-        center_x_norm = center_x / float(image_width)
-        center_y_norm = center_y / float(image_height)
-        box_width_norm = box_width / float(image_width)
-        box_height_norm = box_height / float(image_height)
+        # Files are named after their image ID inside the directory of their split
+        failed_images = set()
+        for path in failed_paths:
+            split = self._split_by_dir.get(os.path.dirname(path))
+            image_id = os.path.splitext(os.path.basename(path))[0]
+            if split is not None and image_id.isdigit():
+                failed_images.add((int(image_id), split))
+        return sorted(failed_images)
         
-        # Create YOLO format string
-        return f"{class_index} {center_x_norm} {center_y_norm} {box_width_norm} {box_height_norm}"
-    
     def create_label_file(self, annotations: pd.DataFrame, image_id: int, split: str) -> str:
         """
         Create a label file for a single image.
@@ -192,19 +310,84 @@ class YOLOFormatBase:
         # Create the destination path
         dest_path = os.path.join(labels_dir, f"{image_id}.txt")
         
-        # Convert annotations to YOLO format
-        yolo_lines = []
-        for _, row in annotations.iterrows():
-            yolo_line = self.row_to_yolo_format(row)
-            if yolo_line:
-                yolo_lines.append(yolo_line)
-                
+        # Resolve class indices and drop annotations without an EPPO code or a class, as one mask
+        eppo_codes = annotations['EPPOCode']
+        class_indices = self.resolve_eppo_series(eppo_codes, annotations['cotyledon'])
+        keep = eppo_codes.notna().to_numpy() & (class_indices >= 0)
+        
+        # Compute normalized box centers and sizes for all annotations at once. The pixel
+        # coordinates are masked as float32 and only the kept rows are upcast: the arithmetic
+        # runs in float64 so the printed sixth decimal does not depend on the storage type
+        coordinates = annotations[['MinX', 'MinY', 'MaxX', 'MaxY', 'Width', 'Height']].to_numpy()[keep]
+        min_x, min_y, max_x, max_y, image_width, image_height = coordinates.astype(np.float64).T
+        box_width = max_x - min_x
+        box_height = max_y - min_y
+        
+        center_x_norm = (box_width / 2 + min_x) / image_width
+        center_y_norm = (box_height / 2 + min_y) / image_height
+        box_width_norm = box_width / image_width
+        box_height_norm = box_height / image_height
+        
+        # Convert annotations to YOLO format with one formatting call for the whole file
+        rows = np.column_stack([class_indices[keep], center_x_norm, center_y_norm, box_width_norm, box_height_norm])
+        label_data = (_label_template(len(rows)) % tuple(rows.ravel().tolist())).encode()
+        
         # Write the label file
-        with open(dest_path, 'w') as f:
-            f.write('\n'.join(yolo_lines))
+        if self.use_io_uring:
+            # Written with the next io_uring batch; see wait_for_image_files()
+            self._get_batch_writer().write_file(dest_path, label_data)
+        else:
+            with open(dest_path, 'wb') as f:
+                f.write(label_data)
             
         return dest_path
         
+    def resolve_eppo_series(self, eppo_codes: pd.Series, cotyledon: pd.Series) -> np.ndarray:
+        """
+        Get the class index of every annotation, following find_relevant_eppo.
+        
+        Args:
+            eppo_codes: EPPO codes from the database
+            cotyledon: Cotyledon IDs of the same annotations
+            
+        Returns:
+            Array of class indices, -1 for annotations that should be skipped
+        """
+        # Resolve each distinct code once (cached across images) and map them back by category code
+        categories = pd.Categorical(eppo_codes)
+        lookup = np.array(
+            [self._eppo_class_index(code) for code in categories.categories] + [-1], 
+            dtype=np.int64
+        )
+        codes = categories.codes
+        class_indices = lookup[codes]
+        
+        # Codes without a match fall back to the monocot/dicot classes by cotyledon;
+        # missing codes (category code -1) are skipped
+        cotyledon = cotyledon.to_numpy()
+        unmatched = (class_indices < 0) & (codes >= 0)
+        class_indices[unmatched & (cotyledon == -100)] = self._eppo_index.get('PPPMM', -1)
+        class_indices[unmatched & (cotyledon == -101)] = self._eppo_index.get('PPPDD', -1)
+        
+        return class_indices
+        
+    def _eppo_class_index(self, eppo_code: str) -> int:
+        """
+        Get the class index of a database EPPO code after prefix normalization.
+        
+        Args:
+            eppo_code: EPPO code from the database
+            
+        Returns:
+            Class index, or -1 if the code does not match a configured EPPO code
+        """
+        class_index = self._eppo_class_cache.get(eppo_code)
+        if class_index is None:
+            relevant_eppo = find_relevant_eppo(eppo_code, None, self._eppo_index, self._prefixes)
+            class_index = self._eppo_index[relevant_eppo] if relevant_eppo is not None else -1
+            self._eppo_class_cache[eppo_code] = class_index
+        return class_index
+        
     def create_dataset_yaml(self) -> str:
         """
         Create the dataset YAML file.
@@ -227,6 +410,6 @@ class YOLOFormatBase:
         
         # Write YAML file
         with open(yaml_path, 'w') as f:
-            yaml.dump(yaml_content, f, default_flow_style=False)
+            yaml.dump(yaml_content, f, Dumper=_YAML_DUMPER, default_flow_style=False)
             
         return yaml_path
\ No newline at end of file
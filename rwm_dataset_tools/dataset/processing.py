@@ -10,17 +10,27 @@ from typing import Dict, Any, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
-def partition_by_image_id(data: pd.DataFrame) -> Dict[int, pd.DataFrame]:
+def partition_by_image_id(data: pd.DataFrame) -> Tuple[pd.DataFrame, List[Tuple[int, int, int]]]:
     """
     Partition annotation data by image ID.
     
+    The annotations are sorted by image ID into a single DataFrame, so the rows of
+    an image can be taken as a slice instead of building a DataFrame per image.
+    
     Args:
         data: DataFrame with annotation data
         
     Returns:
-        Dictionary mapping image IDs to DataFrames with annotations
+        Tuple of (data sorted by image ID, list of (image_id, start, stop) row ranges)
     """
-    return {img_id: group for img_id, group in data.groupby('ImageId')}
+    data = data.sort_values('ImageId', kind='stable').reset_index(drop=True)
+    image_ids = data['ImageId'].to_numpy()
+    
+    # An image starts wherever the (sorted) image ID changes
+    starts = np.r_[0, np.flatnonzero(np.diff(image_ids)) + 1] if len(image_ids) else np.array([], dtype=np.int64)
+    stops = np.r_[starts[1:], len(image_ids)]
+    
+    return data, list(zip(image_ids[starts].tolist(), starts.tolist(), stops.tolist()))
 
 def process_psez_annotations(data: pd.DataFrame, psez_crops: List[str]) -> pd.DataFrame:
     """
@@ -33,49 +43,46 @@ def process_psez_annotations(data: pd.DataFrame, psez_crops: List[str]) -> pd.Da
     Returns:
         DataFrame with processed annotations
     """
-    logger.info("Processing PSEZ annotations...")
+    logger.debug("Processing PSEZ annotations...")
     
     # Separate PSEZ and non-PSEZ annotations
-    psez_data = data[data['EPPOCode'] == 'PSEZ'].copy()
-    non_psez_data = data[data['EPPOCode'] != 'PSEZ'].copy()
+    psez_data = data[data['EPPOCode'] == 'PSEZ']
+    non_psez_data = data[data['EPPOCode'] != 'PSEZ']
     
-    logger.info(f"Found {len(psez_data)} PSEZ annotations")
+    logger.debug(f"Found {len(psez_data)} PSEZ annotations")
     
-    # Initialize list to store PSEZ annotations that are enclosed by a crop
-    valid_psez_indices = []
+    # Pair every PSEZ box with every crop box in the same image
+    psez_centers = pd.DataFrame({
+        'position': np.arange(len(psez_data)),
+        'ImageId': psez_data['ImageId'].to_numpy(),
+        'CenterX': psez_data['MinX'].to_numpy() + (psez_data['MaxX'].to_numpy() - psez_data['MinX'].to_numpy()) / 2.0,
+        'CenterY': psez_data['MinY'].to_numpy() + (psez_data['MaxY'].to_numpy() - psez_data['MinY'].to_numpy()) / 2.0,
+    })
+    crop_boxes = non_psez_data.loc[
+        non_psez_data['EPPOCode'].isin(psez_crops),
+        ['ImageId', 'MinX', 'MinY', 'MaxX', 'MaxY']
+    ]
+    pairs = psez_centers.merge(crop_boxes, on='ImageId')
     
-    # For each PSEZ annotation
-    for idx, psez_row in psez_data.iterrows():
-        image_id = psez_row['ImageId']
-        
-        # Check if there's a crop box in the same image that encloses this PSEZ
-        crop_boxes = non_psez_data[
-            (non_psez_data['ImageId'] == image_id) & 
-            (non_psez_data['EPPOCode'].isin(psez_crops))
-        ]
-        
-        for _, crop_row in crop_boxes.iterrows():
-            # Check if the center of PSEZ is inside the crop box
-            if center_enclosed(
-                inner_box=np.array([
-                    psez_row['MinX'], psez_row['MinY'], 
-                    psez_row['MaxX'], psez_row['MaxY']
-                ]),
-                outer_box=np.array([
-                    crop_row['MinX'], crop_row['MinY'], 
-                    crop_row['MaxX'], crop_row['MaxY']
-                ])
-            ):
-                # This PSEZ is inside a crop box
-                valid_psez_indices.append(idx)
-                logger.debug(f"PSEZ {psez_row['Id']} is enclosed by crop {crop_row['Id']} ({crop_row['EPPOCode']})")
-                break
+    # Check for all pairs at once if the center of the PSEZ is inside the crop box
+    center_x = pairs['CenterX'].to_numpy()
+    center_y = pairs['CenterY'].to_numpy()
+    enclosed = (
+        (center_x > pairs['MinX'].to_numpy()) &
+        (center_y > pairs['MinY'].to_numpy()) &
+        (center_x < pairs['MaxX'].to_numpy()) &
+        (center_y < pairs['MaxY'].to_numpy())
+    )
+    
+    # A PSEZ is valid if at least one crop box encloses it
+    valid_psez_positions = np.unique(pairs['position'].to_numpy()[enclosed])
+    logger.debug(f"Checked {len(pairs)} PSEZ/crop box pairs")
     
     # Get all valid PSEZ annotations
-    valid_psez_data = psez_data.loc[valid_psez_indices]
+    valid_psez_data = psez_data.iloc[valid_psez_positions]
     
-    logger.info(f"Found {len(valid_psez_data)} valid PSEZ annotations inside crop boxes")
-    logger.info(f"Filtered out {len(psez_data) - len(valid_psez_data)} PSEZ annotations")
+    logger.debug(f"Found {len(valid_psez_data)} valid PSEZ annotations inside crop boxes")
+    logger.debug(f"Filtered out {len(psez_data) - len(valid_psez_data)} PSEZ annotations")
     
     # Combine valid PSEZ and non-PSEZ annotations
     result = pd.concat([non_psez_data, valid_psez_data])
@@ -108,27 +115,37 @@ def center_enclosed(inner_box: np.ndarray, outer_box: np.ndarray) -> bool:
         center_y < outer_box[3]      # y2
     )
 
-def find_relevant_eppo(eppo_code: str, cotyledon_id: int, eppo_codes: List[str]) -> Optional[str]:
+def find_relevant_eppo(
+    eppo_code: str, 
+    cotyledon_id: int, 
+    eppo_codes: List[str],
+    prefixes: Optional[Tuple[str, ...]] = None
+) -> Optional[str]:
     """
     Find the relevant EPPO code for an annotation, following the same logic as I-GIS scripts.
     
     Args:
         eppo_code: Original EPPO code
         cotyledon_id: Cotyledon ID
-        eppo_codes: List of valid EPPO codes
+        eppo_codes: List (or set/dict) of valid EPPO codes
+        prefixes: Valid EPPO codes sorted longest first; derived from eppo_codes if not given
         
     Returns:
         Relevant EPPO code or None if no relevant code found
     """
-    # Handle prefixes (e.g., SOLTU1 -> SOLTU)
-    for valid_eppo in eppo_codes:
-        if eppo_code.startswith(valid_eppo):
-            eppo_code = valid_eppo
-    
-    # Find the EPPO code to use
+    # Exact matches need no prefix handling
     if eppo_code in eppo_codes:
         return eppo_code
-    elif cotyledon_id == -100:
+        
+    # Handle prefixes (e.g., SOLTU1 -> SOLTU); the longest matching code wins
+    if prefixes is None:
+        prefixes = tuple(sorted(eppo_codes, key=len, reverse=True))
+    for valid_eppo in prefixes:
+        if eppo_code.startswith(valid_eppo):
+            return valid_eppo
+    
+    # Fall back to the monocot/dicot classes
+    if cotyledon_id == -100:
         return 'PPPMM'  # Monocot
     elif cotyledon_id == -101:
         return 'PPPDD'  # Dicot
@@ -196,6 +213,61 @@ def determine_dataset_split(
     split_idx = rng.choice(3, p=probabilities)
     return ['train', 'val', 'test'][split_idx]
 
+def assign_dataset_splits(
+    images: pd.DataFrame,
+    config: Dict[str, Any],
+    rng: np.random.RandomState = None,
+    fixed_sets: Optional[Dict[str, frozenset]] = None
+) -> Dict[int, str]:
+    """
+    Determine the dataset split of many images at once, following the same rules
+    as determine_dataset_split.
+    
+    Args:
+        images: DataFrame with one row (ImageId, UploadId, GrownWeed) per image, in processing order
+        config: Configuration dictionary
+        rng: Random number generator for reproducibility
+        fixed_sets: Fixed upload/image sets as frozensets; built from config if not given
+        
+    Returns:
+        Dictionary mapping image IDs to 'train', 'val' or 'test'
+    """
+    if rng is None:
+        rng = np.random.RandomState()
+        
+    if fixed_sets is None:
+        fixed_sets = {name: frozenset(ids) for name, ids in config['dataset']['fixed_sets'].items()}
+        
+    upload_ids = images['UploadId']
+    image_ids = images['ImageId']
+    
+    # Rules in order of precedence: fixed uploads, fixed images, grown images to train
+    conditions = [
+        upload_ids.isin(fixed_sets['train_uploads']).to_numpy(),
+        upload_ids.isin(fixed_sets['val_uploads']).to_numpy(),
+        upload_ids.isin(fixed_sets['test_uploads']).to_numpy(),
+        image_ids.isin(fixed_sets['train_images']).to_numpy(),
+        image_ids.isin(fixed_sets['val_images']).to_numpy(),
+        image_ids.isin(fixed_sets['test_images']).to_numpy(),
+        images['GrownWeed'].astype(bool).to_numpy()
+    ]
+    split_idx = np.select(conditions, [0, 1, 2, 0, 1, 2, 0], default=-1)
+    
+    # Distribute the remaining images at random based on probabilities, in a single draw
+    split_probs = config['dataset']['split_probabilities']
+    probabilities = np.array([
+        split_probs['train'],
+        split_probs['val'],
+        split_probs['test']
+    ])
+    probabilities = probabilities / probabilities.sum()
+    
+    random_rows = split_idx < 0
+    split_idx[random_rows] = rng.choice(3, size=int(random_rows.sum()), p=probabilities)
+    
+    split_names = np.array(['train', 'val', 'test'])
+    return dict(zip(image_ids.tolist(), split_names[split_idx].tolist()))
+
 def parse_poly_data(poly_data_str: str) -> List[Dict[str, Any]]:
     """
     Parse the PolyData JSON string to a list of dictionaries.
@@ -2,12 +2,17 @@
 Configuration utilities for the RWM dataset tools.
 """
 import os
+import copy
 import yaml
 import logging
+from functools import lru_cache
 from typing import Dict, Any, Optional
 
 logger = logging.getLogger(__name__)
 
+# Use the libyaml parser when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
 def load_config(config_path: str) -> Dict[str, Any]:
     """
     Load configuration from a YAML file.
@@ -24,9 +29,10 @@ def load_config(config_path: str) -> Dict[str, Any]:
     if not os.path.exists(config_path):
         raise FileNotFoundError(f"Configuration file not found: {config_path}")
         
-    # Load the YAML file
-    with open(config_path, 'r') as f:
-        config = yaml.safe_load(f)
+    # Each file is parsed once per modification time, also when several configs inherit it.
+    # Work on a copy since the result is merged and overridden in place.
+    real_path = os.path.realpath(config_path)
+    config = copy.deepcopy(_parse_yaml_cached(real_path, os.stat(real_path).st_mtime_ns))
         
     # Check if there's an inherit directive
     if 'inherit' in config:
@@ -35,7 +41,7 @@ def load_config(config_path: str) -> Dict[str, Any]:
         
         # If it's a relative path, resolve it relative to the current config file
         if not os.path.isabs(inherit_path):
-            config_dir = os.path.dirname(config_path)
+            config_dir = os.path.dirname(os.path.abspath(config_path))
             inherit_path = os.path.join(config_dir, inherit_path)
             
         # Load the inherited config
@@ -51,6 +57,21 @@ def load_config(config_path: str) -> Dict[str, Any]:
     
     return config
 
+@lru_cache(maxsize=64)
+def _parse_yaml_cached(config_path: str, mtime_ns: int) -> Dict[str, Any]:
+    """
+    Parse a YAML file, memoized on path and modification time.
+    
+    Args:
+        config_path: Real path to the YAML file
+        mtime_ns: Modification time of the file in nanoseconds (cache key only)
+        
+    Returns:
+        Parsed YAML content (shared, must not be mutated)
+    """
+    with open(config_path, 'r') as f:
+        return yaml.load(f, Loader=_YAML_LOADER)
+
 def merge_configs(base_config: Dict[str, Any], override_config: Dict[str, Any]) -> Dict[str, Any]:
     """
     Merge two configuration dictionaries.
@@ -3,7 +3,10 @@ Logging utilities for the RWM dataset tools.
 """
 import os
 import sys
+import queue
+import atexit
 import logging
+from logging.handlers import QueueHandler, QueueListener
 from typing import Optional
 
 def setup_logging(
@@ -48,9 +51,14 @@ def setup_logging(
         file_handler.setFormatter(formatter)
         handlers.append(file_handler)
         
-    # Add handlers to logger
-    for handler in handlers:
-        logger.addHandler(handler)
+    # Log records are only enqueued on the calling thread; a background listener
+    # does the console and file I/O
+    if handlers:
+        log_queue = queue.SimpleQueue()
+        logger.addHandler(QueueHandler(log_queue))
+        listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)
         
     # Log setup information
     logging.info(f"Logging initialized (level: {log_level})")
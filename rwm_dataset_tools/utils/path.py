@@ -1,10 +1,19 @@
 import os
 import shutil
 import logging
-from typing import Optional
+import threading
+from typing import List, Optional, Sequence, Tuple
+
+from rwm_dataset_tools.utils.uring import copy_many, uring_available
 
 logger = logging.getLogger(__name__)
 
+# Default number of threads used to copy image files
+DEFAULT_COPY_WORKERS = min(32, 2 * (os.cpu_count() or 1))
+
+# Directories made by create_directory in this process
+_created_dirs = set()
+
 def create_directory(path: str) -> None:
     """
     Create a directory if it doesn't exist.
@@ -12,7 +21,11 @@ def create_directory(path: str) -> None:
     Args:
         path: Directory path
     """
+    # Directories created before are not checked again
+    if path in _created_dirs:
+        return
     os.makedirs(path, exist_ok=True)
+    _created_dirs.add(path)
     logger.debug(f"Created directory: {path}")
 
 def create_symlink(source: str, destination: str, overwrite: bool = False) -> None:
@@ -24,8 +37,8 @@ def create_symlink(source: str, destination: str, overwrite: bool = False) -> No
         destination: Destination path
         overwrite: Whether to overwrite an existing link
     """
-    # Ensure the source exists
-    if not os.path.exists(source):
+    # Ensure the source exists; a source that is itself a symlink is linked even if it dangles
+    if not os.path.lexists(source):
         logger.warning(f"Source path does not exist: {source}")
         raise FileNotFoundError(f"Source file not found: {source}")
         
@@ -37,23 +50,26 @@ def create_symlink(source: str, destination: str, overwrite: bool = False) -> No
     parent_dir = os.path.dirname(destination)
     create_directory(parent_dir)
     
-    # Remove existing link if overwrite is True
-    if os.path.exists(destination):
-        if overwrite:
+    # Create the symbolic link, replacing an existing file only if overwrite is True
+    try:
+        try:
+            os.symlink(source_abs, dest_abs)
+        except FileExistsError:
+            if not overwrite:
+                logger.debug(f"Destination already exists: {dest_abs}")
+                return
+            # Link under a temporary name and rename it over the destination, so the
+            # destination is replaced atomically and never missing
+            tmp_abs = f"{dest_abs}.tmp.{os.getpid()}.{threading.get_ident()}"
+            os.symlink(source_abs, tmp_abs)
             try:
-                os.remove(destination)
-                logger.debug(f"Removed existing file: {dest_abs}")
-            except Exception as e:
-                logger.error(f"Failed to remove existing file {dest_abs}: {e}")
+                os.replace(tmp_abs, dest_abs)
+            except OSError:
+                os.remove(tmp_abs)
                 raise
-        else:
-            logger.debug(f"Destination already exists: {dest_abs}")
-            return
-    
-    # Create the symbolic link
-    try:
-        os.symlink(source_abs, dest_abs)
-        logger.debug(f"Created symlink: {source_abs} -> {dest_abs}")
+            logger.debug(f"Replaced existing file: {dest_abs}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Created symlink: {source_abs} -> {dest_abs}")
     except Exception as e:
         # Check for specific permission errors
         if isinstance(e, PermissionError):
@@ -63,6 +79,81 @@ def create_symlink(source: str, destination: str, overwrite: bool = False) -> No
             logger.error(f"Failed to create symlink: {e}")
         raise    
 
+def create_hardlink(source: str, destination: str) -> None:
+    """
+    Create a hard link. An existing destination is left untouched.
+    
+    Args:
+        source: Source path
+        destination: Destination path (must be on the same file system as source)
+    """
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        logger.debug(f"Destination already exists: {destination}")
+        return
+    logger.debug(f"Created hardlink: {source} -> {destination}")
+
+def copy_file(source: str, destination: str, overwrite: bool = False) -> None:
+    """
+    Copy a file, using the in-kernel copy_file_range where available.
+    
+    Args:
+        source: Source path
+        destination: Destination path
+        overwrite: Whether to overwrite an existing file
+    """
+    with open(source, 'rb') as src:
+        try:
+            dst = open(destination, 'wb' if overwrite else 'xb')
+        except FileExistsError:
+            logger.debug(f"Destination already exists: {destination}")
+            return
+            
+        try:
+            with dst:
+                if hasattr(os, 'copy_file_range'):
+                    try:
+                        remaining = os.fstat(src.fileno()).st_size
+                        while remaining > 0:
+                            copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                            if copied == 0:
+                                break
+                            remaining -= copied
+                    except OSError as e:
+                        # Not supported for this file system pair
+                        logger.debug(f"copy_file_range failed ({e}), falling back to buffered copy")
+                # Copy whatever is left; both file offsets are past the bytes copied above
+                shutil.copyfileobj(src, dst)
+        except OSError:
+            # Don't leave a partial file behind, it would be skipped as existing next time
+            os.remove(destination)
+            raise
+            
+    logger.debug(f"Copied: {source} -> {destination}")
+
+def copy_files(pairs: Sequence[Tuple[str, str]], use_io_uring: bool = False) -> List[Tuple[str, str, Exception]]:
+    """
+    Copy a batch of files, optionally with io_uring.
+    
+    Args:
+        pairs: Sequence of (source, destination) paths
+        use_io_uring: Copy with io_uring when it is available
+        
+    Returns:
+        List of (source, destination, error) for the copies that failed
+    """
+    if use_io_uring and uring_available():
+        return copy_many(pairs)
+        
+    failures = []
+    for source, destination in pairs:
+        try:
+            copy_file(source, destination)
+        except Exception as e:
+            failures.append((source, destination, e))
+    return failures
+
 def remove_directory(path: str) -> None:
     """
     Remove a directory and all its contents.
@@ -73,6 +164,10 @@ def remove_directory(path: str) -> None:
     if os.path.exists(path):
         shutil.rmtree(path)
         logger.debug(f"Removed directory: {path}")
+        
+    # Forget the removed directories so create_directory makes them again
+    prefix = os.path.join(path, '')
+    _created_dirs.difference_update([d for d in _created_dirs if d == path or d.startswith(prefix)])
 
 def get_file_extension(path: str) -> str:
     """
@@ -84,6 +179,9 @@ def get_file_extension(path: str) -> str:
     Returns:
         File extension (including the dot)
     """
-    return os.path.splitext(path)[1]
+    # Same result as os.path.splitext(path)[1] (leading dots of the file name do not start
+    # an extension), with two C-level string scans
+    _, dot, ext = path.rpartition(os.sep)[2].lstrip('.').rpartition('.')
+    return dot + ext if dot else ''
 
     
\ No newline at end of file
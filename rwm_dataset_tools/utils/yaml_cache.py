@@ -0,0 +1,117 @@
+"""
+Cached YAML loading for the RWM dataset tools.
+"""
+import os
+import copy
+import json
+import yaml
+import threading
+from collections import OrderedDict
+from typing import Any, Tuple
+
+# Maximum number of parsed files kept in memory
+MAX_CACHE_ENTRIES = 100
+
+# Real path -> (modification time in ns, size, parsed content), least recently used first
+_CACHE: 'OrderedDict[str, Tuple[int, int, Any]]' = OrderedDict()
+_CACHE_LOCK = threading.Lock()
+
+# Suffix of the JSON copy written next to a YAML file, see load_yaml(sidecar=True)
+SIDECAR_SUFFIX = '.json'
+
+_MISSING = object()
+
+# Buffer size for reading YAML files
+READ_BUFFER_SIZE = 1 << 18
+
+# Use the libyaml parser when PyYAML was built with it
+_YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+def load_yaml(path: str, sidecar: bool = False) -> Any:
+    """
+    Load a YAML file, reusing the parsed content while the file is unchanged.
+    
+    Args:
+        path: Path to the YAML file
+        sidecar: Also keep a JSON copy next to the file, which later processes load
+            instead of parsing the YAML again
+    
+    Returns:
+        Parsed YAML content (a copy that the caller may modify)
+    """
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    
+    with _CACHE_LOCK:
+        entry = _CACHE.get(real_path)
+        if entry is not None and entry[0] == stat.st_mtime_ns and entry[1] == stat.st_size:
+            _CACHE.move_to_end(real_path)
+            return copy.deepcopy(entry[2])
+    
+    content = _read_sidecar(real_path, stat) if sidecar else _MISSING
+    if content is _MISSING:
+        # Read the file in one call and let the parser decode the bytes
+        with open(real_path, 'rb', buffering=READ_BUFFER_SIZE) as f:
+            content = yaml.load(f.read(), Loader=_YAML_LOADER)
+        if sidecar:
+            _write_sidecar(real_path, stat, content)
+    
+    with _CACHE_LOCK:
+        _CACHE[real_path] = (stat.st_mtime_ns, stat.st_size, content)
+        _CACHE.move_to_end(real_path)
+        while len(_CACHE) > MAX_CACHE_ENTRIES:
+            _CACHE.popitem(last=False)
+    
+    return copy.deepcopy(content)
+
+def _read_sidecar(real_path: str, stat: os.stat_result) -> Any:
+    """
+    Read the JSON copy of a YAML file if it was written for the current version of the file.
+    
+    Args:
+        real_path: Real path to the YAML file
+        stat: Result of os.stat on the YAML file
+        
+    Returns:
+        Parsed content, or _MISSING if there is no up-to-date sidecar
+    """
+    try:
+        with open(real_path + SIDECAR_SUFFIX, 'r') as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        return _MISSING
+        
+    if sidecar.get('mtime_ns') != stat.st_mtime_ns or sidecar.get('size') != stat.st_size:
+        return _MISSING
+    return sidecar.get('content')
+
+def _write_sidecar(real_path: str, stat: os.stat_result, content: Any) -> None:
+    """
+    Write the JSON copy of a parsed YAML file, tagged with the version of the file.
+    
+    Args:
+        real_path: Real path to the YAML file
+        stat: Result of os.stat on the YAML file before it was parsed
+        content: Parsed YAML content
+    """
+    # Skip content that JSON cannot represent exactly (e.g. non-string keys or dates)
+    try:
+        encoded = json.dumps({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'content': content})
+    except (TypeError, ValueError):
+        return
+    if json.loads(encoded)['content'] != content:
+        return
+        
+    # Write to a temporary file first so readers never see a partial sidecar
+    sidecar_path = real_path + SIDECAR_SUFFIX
+    tmp_path = f"{sidecar_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(encoded)
+        os.replace(tmp_path, sidecar_path)
+    except OSError:
+        # The sidecar is only an optimization; e.g. the directory may be read-only
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,148 @@
+"""
+Tests for creating dataset files from streamed annotation chunks.
+"""
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyodbc')
+
+from rwm_dataset_tools.dataset.extraction import DatasetExtractor
+from rwm_dataset_tools.dataset.processing import assign_dataset_splits
+
+SPLITS = ['train', 'val', 'test']
+
+class StubFormatHandler:
+    """
+    Stands in for the YOLO format handler, recording the split of every image and label.
+    
+    Label files of label_errors fail right away; files of background_errors are reported
+    as failed by wait_for_image_files, like copies and io_uring writes finishing late.
+    """
+    def __init__(self, label_errors=(), background_errors=()):
+        self.lock = threading.Lock()
+        self.images = {}
+        self.labels = {}
+        self.label_errors = set(label_errors)
+        self.background_errors = set(background_errors)
+    
+    def create_image_file(self, source_path, image_id, split):
+        with self.lock:
+            self.images[image_id] = split
+    
+    def create_label_file(self, annotations, image_id, split):
+        if image_id in self.label_errors:
+            raise OSError(f"Cannot write label file of image {image_id}")
+        with self.lock:
+            self.labels[image_id] = (split, len(annotations))
+    
+    def wait_for_image_files(self):
+        return [(image_id, self.images[image_id]) for image_id in sorted(self.background_errors)]
+
+def make_config(tmp_path):
+    return {
+        'random_seed': 3,
+        'database': {'driver': 'stub', 'server': 'stub', 'name': 'stub', 'user': 'stub', 'password': 'stub'},
+        'paths': {'rwm_data': str(tmp_path / 'rwm_data')},
+        'dataset': {
+            'psez_crops': ['ZEAMX'],
+            'num_workers': 4,
+            'fixed_sets': {name: [] for name in [
+                'train_uploads', 'val_uploads', 'test_uploads', 'train_images', 'val_images', 'test_images'
+            ]},
+            'split_probabilities': {'train': 0.7, 'val': 0.2, 'test': 0.1},
+        },
+    }
+
+def make_annotations(num_images, rows_per_image=3):
+    image_ids = np.repeat(np.arange(1, num_images + 1), rows_per_image)
+    return pd.DataFrame({
+        'Id': np.arange(len(image_ids)),
+        'ImageId': image_ids,
+        'UploadId': 7,
+        'FileName': [f'{image_id}.jpg' for image_id in image_ids],
+        'GrownWeed': 0,
+        'EPPOCode': 'ZEAMX',
+        'cotyledon': 0,
+        'MinX': 1.0,
+        'MinY': 1.0,
+        'MaxX': 5.0,
+        'MaxY': 5.0,
+        'Width': 10.0,
+        'Height': 10.0,
+    })
+
+def make_chunks(data, rows_per_chunk):
+    for start in range(0, len(data), rows_per_chunk):
+        yield data.iloc[start:start + rows_per_chunk].reset_index(drop=True)
+
+def make_source_images(tmp_path, image_ids):
+    upload_dir = tmp_path / 'rwm_data' / '7'
+    upload_dir.mkdir(parents=True)
+    for image_id in image_ids:
+        (upload_dir / f'{image_id}.jpg').write_bytes(b'jpg')
+
+def test_create_dataset_files_counts_and_splits(tmp_path):
+    config = make_config(tmp_path)
+    handler = StubFormatHandler()
+    extractor = DatasetExtractor(config, handler)
+    data = make_annotations(120)
+    missing = {5, 60}
+    make_source_images(tmp_path, [image_id for image_id in range(1, 121) if image_id not in missing])
+    
+    stats = extractor._create_dataset_files(make_chunks(data, 30))
+    
+    # Splits follow one pass over all images in ID order, however the stream was chunked
+    image_rows = data.drop_duplicates('ImageId')
+    expected = assign_dataset_splits(image_rows, config, np.random.RandomState(3), extractor.fixed_sets)
+    for image_id in missing:
+        del expected[image_id]
+    assert handler.images == expected
+    assert {image_id: split for image_id, (split, _) in handler.labels.items()} == expected
+    
+    assert stats['total_images'] == 120
+    assert stats['skipped_images'] == len(missing)
+    assert stats['errors'] == 0
+    assert stats['total_annotations'] == 3 * len(expected)
+    for split in SPLITS:
+        count = sum(1 for value in expected.values() if value == split)
+        assert stats[f'{split}_images'] == count
+        assert stats[f'{split}_annotations'] == 3 * count
+
+def test_create_dataset_files_reraises_producer_errors(tmp_path):
+    config = make_config(tmp_path)
+    extractor = DatasetExtractor(config, StubFormatHandler())
+    make_source_images(tmp_path, range(1, 11))
+    
+    def failing_chunks():
+        yield make_annotations(10)
+        raise RuntimeError('connection lost')
+    
+    with pytest.raises(RuntimeError, match='connection lost'):
+        extractor._create_dataset_files(failing_chunks())
+    
+    # The producer thread has been joined
+    assert not any(thread.name == 'annotation-fetch' for thread in threading.enumerate())
+
+def test_create_dataset_files_counts_background_failures(tmp_path):
+    config = make_config(tmp_path)
+    # The failures fall in every split; image 9 fails in _process_image and is reported
+    # again by the background writer
+    handler = StubFormatHandler(label_errors={9}, background_errors={4, 9, 26, 31})
+    extractor = DatasetExtractor(config, handler)
+    data = make_annotations(100, rows_per_image=2)
+    make_source_images(tmp_path, range(1, 101))
+    
+    stats = extractor._create_dataset_files(make_chunks(data, 40))
+    
+    image_rows = data.drop_duplicates('ImageId')
+    splits = assign_dataset_splits(image_rows, config, np.random.RandomState(3), extractor.fixed_sets)
+    failed = {4, 9, 26, 31}
+    assert stats['errors'] == len(failed)
+    assert stats['total_annotations'] == 2 * (100 - len(failed))
+    for split in SPLITS:
+        count = sum(1 for image_id, value in splits.items() if value == split and image_id not in failed)
+        assert stats[f'{split}_images'] == count
+        assert stats[f'{split}_annotations'] == 2 * count
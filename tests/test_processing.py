@@ -0,0 +1,163 @@
+"""
+Tests for the annotation processing functions.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from rwm_dataset_tools.dataset.processing import (
+    assign_dataset_splits,
+    center_enclosed,
+    determine_dataset_split,
+    find_relevant_eppo,
+    partition_by_image_id,
+    process_psez_annotations,
+)
+
+EPPO_CODES = ['SOLTU', 'SOLTUX', 'ZEAMX', 'PPPMM', 'PPPDD']
+
+def make_config(fixed_sets=None):
+    """
+    Build the dataset part of a configuration for split assignment.
+    """
+    sets = {name: [] for name in [
+        'train_uploads', 'val_uploads', 'test_uploads', 'train_images', 'val_images', 'test_images'
+    ]}
+    sets.update(fixed_sets or {})
+    return {
+        'dataset': {
+            'fixed_sets': sets,
+            'split_probabilities': {'train': 0.7, 'val': 0.2, 'test': 0.1},
+        }
+    }
+
+def psez_reference(data, psez_crops):
+    """
+    Row-by-row PSEZ filter as it was before the merge-based version.
+    """
+    psez_data = data[data['EPPOCode'] == 'PSEZ']
+    non_psez_data = data[data['EPPOCode'] != 'PSEZ']
+    
+    valid_psez_indices = []
+    for idx, psez_row in psez_data.iterrows():
+        crop_boxes = non_psez_data[
+            (non_psez_data['ImageId'] == psez_row['ImageId']) &
+            (non_psez_data['EPPOCode'].isin(psez_crops))
+        ]
+        for _, crop_row in crop_boxes.iterrows():
+            if center_enclosed(
+                np.array([psez_row['MinX'], psez_row['MinY'], psez_row['MaxX'], psez_row['MaxY']]),
+                np.array([crop_row['MinX'], crop_row['MinY'], crop_row['MaxX'], crop_row['MaxY']])
+            ):
+                valid_psez_indices.append(idx)
+                break
+    
+    return pd.concat([non_psez_data, psez_data.loc[valid_psez_indices]])
+
+def test_partition_by_image_id_row_ranges():
+    data = pd.DataFrame({
+        'ImageId': [5, 3, 5, 9, 3, 5],
+        'Id': [0, 1, 2, 3, 4, 5],
+    })
+    
+    sorted_data, ranges = partition_by_image_id(data)
+    
+    assert ranges == [(3, 0, 2), (5, 2, 5), (9, 5, 6)]
+    for image_id, start, stop in ranges:
+        rows = sorted_data.iloc[start:stop]
+        assert (rows['ImageId'] == image_id).all()
+    
+    # Rows of an image keep their original order
+    assert sorted_data['Id'].tolist() == [1, 4, 0, 2, 5, 3]
+
+def test_partition_by_image_id_empty():
+    data = pd.DataFrame({'ImageId': pd.Series([], dtype='int64')})
+    
+    sorted_data, ranges = partition_by_image_id(data)
+    
+    assert len(sorted_data) == 0
+    assert ranges == []
+
+@pytest.mark.parametrize('seed', [0, 42])
+def test_assign_dataset_splits_matches_determine_dataset_split(seed):
+    rng = np.random.RandomState(1234)
+    images = pd.DataFrame({
+        'ImageId': np.arange(500),
+        'UploadId': rng.randint(0, 20, size=500),
+        'GrownWeed': rng.rand(500) < 0.1,
+    })
+    config = make_config({
+        'train_uploads': [1],
+        'val_uploads': [2],
+        'test_uploads': [3],
+        'train_images': [10, 11],
+        'val_images': [12],
+        'test_images': [13, 14],
+    })
+    
+    splits = assign_dataset_splits(images, config, np.random.RandomState(seed))
+    
+    reference_rng = np.random.RandomState(seed)
+    expected = {
+        image_id: determine_dataset_split(images.iloc[[i]], config, reference_rng)
+        for i, image_id in enumerate(images['ImageId'])
+    }
+    assert splits == expected
+
+def test_process_psez_annotations_matches_reference():
+    rng = np.random.RandomState(7)
+    n = 300
+    min_x = rng.randint(0, 80, size=n).astype(np.float32)
+    min_y = rng.randint(0, 80, size=n).astype(np.float32)
+    data = pd.DataFrame({
+        'Id': np.arange(n),
+        'ImageId': rng.randint(0, 30, size=n),
+        'EPPOCode': rng.choice(['PSEZ', 'ZEAMX', 'SOLTU', 'BEAVA'], size=n),
+        'MinX': min_x,
+        'MinY': min_y,
+        'MaxX': min_x + rng.randint(1, 40, size=n),
+        'MaxY': min_y + rng.randint(1, 40, size=n),
+    })
+    psez_crops = ['ZEAMX', 'SOLTU']
+    
+    result = process_psez_annotations(data, psez_crops)
+    expected = psez_reference(data, psez_crops)
+    
+    # Some PSEZ annotations are kept and some are dropped, so both paths are covered
+    psez_kept = (result['EPPOCode'] == 'PSEZ').sum()
+    assert 0 < psez_kept < (data['EPPOCode'] == 'PSEZ').sum()
+    pd.testing.assert_frame_equal(result.sort_values('Id'), expected.sort_values('Id'))
+
+def test_process_psez_annotations_without_crops():
+    data = pd.DataFrame({
+        'Id': [0, 1],
+        'ImageId': [1, 1],
+        'EPPOCode': ['PSEZ', 'BEAVA'],
+        'MinX': [0.0, 0.0],
+        'MinY': [0.0, 0.0],
+        'MaxX': [10.0, 20.0],
+        'MaxY': [10.0, 20.0],
+    })
+    
+    result = process_psez_annotations(data, ['ZEAMX'])
+    
+    assert result['Id'].tolist() == [1]
+
+@pytest.mark.parametrize('eppo_code, cotyledon_id, expected', [
+    ('ZEAMX', None, 'ZEAMX'),
+    ('SOLTU', None, 'SOLTU'),
+    ('SOLTU1', None, 'SOLTU'),
+    ('SOLTUX2', None, 'SOLTUX'),
+    ('BEAVA', -100, 'PPPMM'),
+    ('BEAVA', -101, 'PPPDD'),
+    ('BEAVA', 0, None),
+    ('ZEAMX', -101, 'ZEAMX'),
+])
+def test_find_relevant_eppo(eppo_code, cotyledon_id, expected):
+    assert find_relevant_eppo(eppo_code, cotyledon_id, EPPO_CODES) == expected
+
+def test_find_relevant_eppo_with_prefixes():
+    prefixes = tuple(sorted(EPPO_CODES, key=len, reverse=True))
+    
+    assert find_relevant_eppo('SOLTUX2', None, set(EPPO_CODES), prefixes) == 'SOLTUX'
+    assert find_relevant_eppo('SOLTU2', None, set(EPPO_CODES), prefixes) == 'SOLTU'
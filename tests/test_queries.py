@@ -0,0 +1,87 @@
+"""
+Tests for streaming annotation data from the database.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyodbc')
+
+from rwm_dataset_tools.database.queries import COORDINATE_COLUMNS, RWMDataExtractor
+
+class FakeDatabase:
+    """
+    Stands in for RWMDatabase, returning a fixed result in chunks.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.queries = []
+    
+    def execute_query(self, query, params=None):
+        return pd.DataFrame({'count': [self.data['ImageId'].nunique()]})
+    
+    def execute_query_chunks(self, query, params=None, chunksize=200_000):
+        self.queries.append(query)
+        for start in range(0, len(self.data), chunksize):
+            yield self.data.iloc[start:start + chunksize].reset_index(drop=True)
+    
+    def execute_batch(self, query, params=None):
+        summary = pd.DataFrame({'image_count': [self.data['ImageId'].nunique()], 'eppo_count': [1]})
+        eppo_counts = pd.DataFrame({'EPPOCode': ['ZEAMX  '], 'count': [len(self.data)]})
+        return [summary, eppo_counts]
+
+def make_annotations(rows_per_image):
+    """
+    Build annotation rows sorted by image ID, with the given number of rows per image.
+    """
+    image_ids = np.repeat(np.arange(1, len(rows_per_image) + 1), rows_per_image)
+    data = pd.DataFrame({
+        'Id': np.arange(len(image_ids)),
+        'ImageId': image_ids,
+        'EPPOCode': 'ZEAMX  ',
+    })
+    for column in COORDINATE_COLUMNS:
+        data[column] = 1.0
+    return data
+
+def make_extractor(data):
+    config = {'dataset': {'held_back_images': []}}
+    return RWMDataExtractor(FakeDatabase(data), config)
+
+def test_iter_annotation_chunks_keeps_images_whole():
+    # Image 2 spans the first chunk boundary, and image 3 fills the whole third chunk
+    data = make_annotations([3, 4, 8, 1, 2])
+    extractor = make_extractor(data)
+    
+    chunks = list(extractor.iter_annotation_chunks(chunksize=5))
+    
+    assert 'ORDER BY' in extractor.db.queries[0]
+    assert pd.concat(chunks)['Id'].tolist() == data['Id'].tolist()
+    seen = set()
+    for chunk in chunks:
+        image_ids = set(chunk['ImageId'])
+        assert not image_ids & seen
+        seen |= image_ids
+    assert seen == {1, 2, 3, 4, 5}
+
+def test_iter_annotation_chunks_cleans_columns():
+    extractor = make_extractor(make_annotations([2, 2]))
+    
+    chunk = next(extractor.iter_annotation_chunks(chunksize=10))
+    
+    assert (chunk['EPPOCode'] == 'ZEAMX').all()
+    assert (chunk[COORDINATE_COLUMNS].dtypes == np.float32).all()
+
+def test_iter_annotation_chunks_empty_result():
+    extractor = make_extractor(make_annotations([]))
+    
+    assert list(extractor.iter_annotation_chunks(chunksize=5)) == []
+
+def test_get_annotation_data_concatenates_chunks():
+    data = make_annotations([3, 4, 8, 1, 2])
+    extractor = make_extractor(data)
+    
+    result = extractor.get_annotation_data()
+    
+    assert result['Id'].tolist() == data['Id'].tolist()
+    assert (result['EPPOCode'] == 'ZEAMX').all()
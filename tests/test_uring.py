@@ -0,0 +1,169 @@
+"""
+Tests for the io_uring file operations.
+"""
+import errno
+import os
+
+import pytest
+
+liburing = pytest.importorskip('liburing')
+
+from rwm_dataset_tools.utils import uring
+from rwm_dataset_tools.utils.uring import UringBatchWriter, copy_many, uring_available
+
+pytestmark = pytest.mark.skipif(not uring_available(), reason="io_uring is not available")
+
+@pytest.fixture
+def indirect_writer(monkeypatch):
+    """
+    A batch writer without direct file slots, as on kernels before 5.19.
+    """
+    def register_files_sparse(ring, nr):
+        raise OSError(errno.EINVAL, os.strerror(errno.EINVAL))
+    
+    monkeypatch.setattr(uring.liburing, 'io_uring_register_files_sparse', register_files_sparse)
+    writer = UringBatchWriter(batch_size=8)
+    assert not writer._direct
+    yield writer
+    writer.close()
+
+def test_batch_writer_writes_files(tmp_path, indirect_writer):
+    contents = {tmp_path / f'{i}.txt': f'{i} 0.500000 0.500000\n'.encode() * (i + 1) for i in range(20)}
+    
+    for path, data in contents.items():
+        indirect_writer.write_file(str(path), data)
+    
+    assert indirect_writer.flush() == []
+    for path, data in contents.items():
+        assert path.read_bytes() == data
+
+def test_batch_writer_replaces_file_content(tmp_path, indirect_writer):
+    path = tmp_path / 'label.txt'
+    path.write_bytes(b'a much longer previous content\n')
+    
+    indirect_writer.write_file(str(path), b'new\n')
+    
+    assert indirect_writer.flush() == []
+    assert path.read_bytes() == b'new\n'
+
+def test_batch_writer_creates_symlinks(tmp_path, indirect_writer):
+    source = tmp_path / 'source.jpg'
+    source.write_bytes(b'jpg')
+    existing = tmp_path / 'existing.jpg'
+    existing.symlink_to(tmp_path / 'other.jpg')
+    
+    indirect_writer.symlink(str(source), str(tmp_path / 'link.jpg'))
+    indirect_writer.symlink(str(source), str(existing))
+    
+    assert indirect_writer.flush() == []
+    assert os.readlink(tmp_path / 'link.jpg') == str(source)
+    # An existing link is kept, like create_symlink without overwrite
+    assert os.readlink(existing) == str(tmp_path / 'other.jpg')
+
+def test_batch_writer_reports_failures(tmp_path, indirect_writer):
+    missing_dir = tmp_path / 'missing'
+    
+    indirect_writer.write_file(str(missing_dir / 'label.txt'), b'0\n')
+    indirect_writer.symlink(str(tmp_path / 'source.jpg'), str(missing_dir / 'link.jpg'))
+    indirect_writer.write_file(str(tmp_path / 'ok.txt'), b'1\n')
+    
+    failures = dict(indirect_writer.flush())
+    
+    assert set(failures) == {str(missing_dir / 'label.txt'), str(missing_dir / 'link.jpg')}
+    assert all(isinstance(error, FileNotFoundError) for error in failures.values())
+    assert (tmp_path / 'ok.txt').read_bytes() == b'1\n'
+    # Failures are returned once
+    assert indirect_writer.flush() == []
+
+@pytest.fixture
+def direct_writer():
+    writer = UringBatchWriter(batch_size=8)
+    if not writer._direct:
+        writer.close()
+        pytest.skip("io_uring direct file slots are not available")
+    yield writer
+    writer.close()
+
+def test_direct_writer_writes_files_in_batches(tmp_path, direct_writer):
+    # More files than slots, so the slots are reused across several submissions
+    contents = {tmp_path / f'{i}.txt': f'{i} 0.250000 0.750000\n'.encode() * (i + 1) for i in range(30)}
+    
+    for path, data in contents.items():
+        direct_writer.write_file(str(path), data)
+    
+    # Full batches are submitted as they fill up, before the flush
+    assert sum(path.exists() for path in contents) >= 24
+    assert direct_writer.flush() == []
+    for path, data in contents.items():
+        assert path.read_bytes() == data
+
+def test_direct_writer_replaces_file_content(tmp_path, direct_writer):
+    path = tmp_path / 'label.txt'
+    path.write_bytes(b'a much longer previous content\n')
+    
+    direct_writer.write_file(str(path), b'new\n')
+    
+    assert direct_writer.flush() == []
+    assert path.read_bytes() == b'new\n'
+
+def test_direct_writer_failed_open_cancels_write(tmp_path, direct_writer):
+    missing = tmp_path / 'missing' / 'label.txt'
+    
+    direct_writer.write_file(str(missing), b'0\n')
+    direct_writer.write_file(str(tmp_path / 'ok.txt'), b'1\n')
+    
+    failures = direct_writer.flush()
+    
+    assert [(path, type(error)) for path, error in failures] == [(str(missing), FileNotFoundError)]
+    assert (tmp_path / 'ok.txt').read_bytes() == b'1\n'
+    
+    # The slot of the failed open is usable again in the next batch
+    direct_writer.write_file(str(tmp_path / 'again.txt'), b'2\n')
+    assert direct_writer.flush() == []
+    assert (tmp_path / 'again.txt').read_bytes() == b'2\n'
+
+def test_copy_many_copies_files(tmp_path):
+    pairs = []
+    for i in range(10):
+        source = tmp_path / f'{i}.jpg'
+        source.write_bytes(os.urandom(1000 * i))
+        pairs.append((str(source), str(tmp_path / f'{i}.copy.jpg')))
+    
+    # A small queue depth splits the copies over several submissions
+    assert copy_many(pairs, queue_depth=4) == []
+    for source, destination in pairs:
+        with open(source, 'rb') as src, open(destination, 'rb') as dst:
+            assert src.read() == dst.read()
+
+def test_copy_many_skips_existing_destinations(tmp_path):
+    source = tmp_path / 'source.jpg'
+    source.write_bytes(b'new')
+    destination = tmp_path / 'destination.jpg'
+    destination.write_bytes(b'old')
+    
+    assert copy_many([(str(source), str(destination))]) == []
+    assert destination.read_bytes() == b'old'
+
+def test_copy_many_reports_missing_sources(tmp_path):
+    source = tmp_path / 'ok.jpg'
+    source.write_bytes(b'jpg')
+    pairs = [(str(tmp_path / 'missing.jpg'), str(tmp_path / 'a.jpg')), (str(source), str(tmp_path / 'b.jpg'))]
+    
+    failures = copy_many(pairs)
+    
+    assert [(src, dst, type(error)) for src, dst, error in failures] == [
+        (str(tmp_path / 'missing.jpg'), str(tmp_path / 'a.jpg'), FileNotFoundError)
+    ]
+    assert not (tmp_path / 'a.jpg').exists()
+    assert (tmp_path / 'b.jpg').read_bytes() == b'jpg'
+
+def test_copy_many_removes_partial_destination(tmp_path):
+    # A directory opens for reading, but the read fails and cancels the linked write
+    source = tmp_path / 'directory.jpg'
+    source.mkdir()
+    destination = tmp_path / 'destination.jpg'
+    
+    failures = copy_many([(str(source), str(destination))])
+    
+    assert [(src, dst, error.errno) for src, dst, error in failures] == [(str(source), str(destination), errno.EISDIR)]
+    assert not destination.exists()
@@ -0,0 +1,79 @@
+"""
+Tests for cached YAML loading.
+"""
+import json
+import os
+
+import pytest
+
+from rwm_dataset_tools.utils import yaml_cache
+from rwm_dataset_tools.utils.yaml_cache import SIDECAR_SUFFIX, load_yaml
+
+DATASET_YAML = "path: /data\nnc: 2\nnames: [ZEAMX, SOLTU]\nsplits: {train: 0.8, val: 0.2}\n"
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    yaml_cache._CACHE.clear()
+    yield
+    yaml_cache._CACHE.clear()
+
+def test_sidecar_matches_yaml(tmp_path):
+    path = tmp_path / 'dataset.yaml'
+    path.write_text(DATASET_YAML)
+    
+    content = load_yaml(str(path), sidecar=True)
+    
+    with open(str(path) + SIDECAR_SUFFIX) as f:
+        sidecar = json.load(f)
+    assert sidecar['content'] == content
+    assert sidecar['mtime_ns'] == os.stat(str(path)).st_mtime_ns
+    assert sidecar['size'] == os.stat(str(path)).st_size
+
+def test_sidecar_is_read_instead_of_yaml(tmp_path):
+    path = tmp_path / 'dataset.yaml'
+    path.write_text(DATASET_YAML)
+    load_yaml(str(path), sidecar=True)
+    
+    # Mark the sidecar content, keeping the version tag of the YAML file
+    sidecar_path = str(path) + SIDECAR_SUFFIX
+    with open(sidecar_path) as f:
+        sidecar = json.load(f)
+    sidecar['content']['nc'] = 99
+    with open(sidecar_path, 'w') as f:
+        json.dump(sidecar, f)
+    yaml_cache._CACHE.clear()
+    
+    assert load_yaml(str(path), sidecar=True)['nc'] == 99
+
+@pytest.mark.parametrize('text', [
+    "names:\n  0: ZEAMX\n  1: SOLTU\n",
+    "created: 2024-05-01\n",
+])
+def test_sidecar_skipped_when_json_round_trip_differs(tmp_path, text):
+    path = tmp_path / 'dataset.yaml'
+    path.write_text(text)
+    
+    content = load_yaml(str(path), sidecar=True)
+    
+    assert not os.path.exists(str(path) + SIDECAR_SUFFIX)
+    assert load_yaml(str(path), sidecar=True) == content
+
+def test_cache_detects_same_size_rewrite(tmp_path):
+    path = tmp_path / 'dataset.yaml'
+    path.write_text("nc: 1\n")
+    stat = os.stat(str(path))
+    assert load_yaml(str(path)) == {'nc': 1}
+    
+    # Same size, modification time only a nanosecond later
+    path.write_text("nc: 2\n")
+    os.utime(str(path), ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    
+    assert load_yaml(str(path)) == {'nc': 2}
+
+def test_returned_content_is_a_copy(tmp_path):
+    path = tmp_path / 'dataset.yaml'
+    path.write_text(DATASET_YAML)
+    
+    load_yaml(str(path))['names'].append('BEAVA')
+    
+    assert load_yaml(str(path))['names'] == ['ZEAMX', 'SOLTU']
@@ -0,0 +1,61 @@
+"""
+Tests for the YOLO format handler.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from rwm_dataset_tools.dataset.formats.yolo import YOLOFormatBase
+from rwm_dataset_tools.dataset.processing import find_relevant_eppo
+
+EPPO_CODES = ['SOLTU', 'SOLTUX', 'ZEAMX', 'PPPMM', 'PPPDD']
+
+def make_handler(tmp_path):
+    config = {
+        'dataset': {
+            'output_dir': str(tmp_path / 'dataset'),
+            'eppo_codes': EPPO_CODES,
+        }
+    }
+    return YOLOFormatBase(config)
+
+def test_resolve_eppo_series_matches_find_relevant_eppo(tmp_path):
+    handler = make_handler(tmp_path)
+    eppo_codes = pd.Series(['ZEAMX', 'SOLTU1', 'SOLTUX2', 'BEAVA', 'BEAVA', 'BEAVA', None, 'ZEAMX'])
+    cotyledon = pd.Series([0, 0, 0, -100, -101, 0, -100, -101])
+    
+    class_indices = handler.resolve_eppo_series(eppo_codes, cotyledon)
+    
+    expected = []
+    for eppo_code, cotyledon_id in zip(eppo_codes, cotyledon):
+        relevant_eppo = find_relevant_eppo(eppo_code, cotyledon_id, EPPO_CODES) if isinstance(eppo_code, str) else None
+        expected.append(EPPO_CODES.index(relevant_eppo) if relevant_eppo else -1)
+    assert class_indices.tolist() == expected
+    assert expected == [2, 0, 1, 3, 4, -1, -1, 2]
+
+def test_create_label_file_bytes(tmp_path):
+    handler = make_handler(tmp_path)
+    os.makedirs(handler.get_split_paths('train')[1], exist_ok=True)
+    annotations = pd.DataFrame({
+        'EPPOCode': ['ZEAMX', 'BEAVA', 'BEAVA', 'BEAVA', None, 'SOLTU1'],
+        'cotyledon': [0, -100, -101, 0, -100, 0],
+        'MinX': [30, 0, 1, 5, 5, 100],
+        'MinY': [70, 0, 1, 5, 5, 200],
+        'MaxX': [130, 300, 2, 50, 50, 200],
+        'MaxY': [140, 700, 3, 50, 50, 301],
+        'Width': 300,
+        'Height': 700,
+    }).astype({column: np.float32 for column in ['MinX', 'MinY', 'MaxX', 'MaxY', 'Width', 'Height']})
+    
+    label_path = handler.create_label_file(annotations, 7, 'train')
+    
+    # Cotyledon codes map to PPPMM/PPPDD, the unknown code and the missing code are
+    # dropped, and every value is rounded to six decimals
+    with open(label_path, 'rb') as f:
+        assert f.read() == (
+            b'2 0.266667 0.150000 0.333333 0.100000\n'
+            b'3 0.500000 0.500000 1.000000 1.000000\n'
+            b'4 0.005000 0.002857 0.003333 0.002857\n'
+            b'0 0.500000 0.357857 0.333333 0.144286\n'
+        )
@@ -1,9 +1,178 @@
 import os
-import yaml
+import sys
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from ultralytics import YOLO
 
-def test_dataset(dataset_yaml, num_batches=2):
+try:
+    from rwm_dataset_tools.utils.yaml_cache import load_yaml
+except ImportError:
+    # Run from a plain checkout without the package installed: parse the YAML directly
+    import yaml
+    
+    def load_yaml(path, sidecar=False):
+        with open(path, 'r') as f:
+            return yaml.safe_load(f)
+
+# YOLO models by checkpoint, reused across check_dataset calls
+_MODEL_CACHE = {}
+
+# Threads used to probe images in the basic loading test
+PROBE_WORKERS = 8
+
+# Image header signatures and JPEG markers used by _read_image_size
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_JPEG_SOF_MARKERS = frozenset({0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF})
+_JPEG_STANDALONE_MARKERS = frozenset({0x01, 0xD0, 0xD1, 0xD2, 0xD3, 0xD4, 0xD5, 0xD6, 0xD7, 0xD8})
+
+# File extensions treated as images when walking the dataset
+IMAGE_EXTENSIONS = {'jpg', 'png'}
+
+def _iter_images(root, exts=IMAGE_EXTENSIONS, limit=None):
+    """
+    Walk a directory tree once and yield the paths of image files.
+    
+    Args:
+        root: Directory to walk
+        exts: Lowercase file extensions (without dot) to yield
+        limit: Stop after this many images (optional)
+    """
+    found = 0
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # Images in the dataset are symlinks, so only directories are skipped by type;
+                    # symlinked directories are not followed
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif os.path.splitext(entry.name)[1][1:].lower() in exts:
+                        yield entry.path
+                        found += 1
+                        if limit is not None and found >= limit:
+                            return
+        except OSError:
+            continue
+
+def _get_model(checkpoint):
+    """
+    Get a YOLO model, loading each checkpoint only once per process.
+    
+    Args:
+        checkpoint: Path or name of the model checkpoint
+        
+    Returns:
+        YOLO model
+    """
+    model = _MODEL_CACHE.get(checkpoint)
+    if model is None:
+        # ultralytics (and torch) is only imported when a model is needed
+        from ultralytics import YOLO
+        model = _MODEL_CACHE.setdefault(checkpoint, YOLO(checkpoint))
+    return model
+
+def _read_image_size(img_path):
+    """
+    Read the size of a JPEG or PNG image from its header, without decoding it.
+    
+    Args:
+        img_path: Path to the image
+        
+    Returns:
+        Tuple of (width, height), or None if the file is not a JPEG or PNG image
+        or its header could not be parsed
+    """
+    with open(img_path, 'rb') as f:
+        head = f.read(24)
+        
+        # PNG: the IHDR chunk with width and height follows the signature
+        if head.startswith(_PNG_SIGNATURE) and head[12:16] == b'IHDR':
+            return struct.unpack('>II', head[16:24])
+            
+        if not head.startswith(b'\xff\xd8'):
+            return None
+            
+        # JPEG: walk the segments until a start-of-frame marker
+        f.seek(2)
+        while True:
+            byte = f.read(1)
+            while byte == b'\xff':
+                byte = f.read(1)
+            if not byte:
+                return None
+            marker = byte[0]
+            if marker in _JPEG_STANDALONE_MARKERS:
+                continue
+            segment = f.read(2)
+            if len(segment) < 2:
+                return None
+            length = struct.unpack('>H', segment)[0]
+            if marker in _JPEG_SOF_MARKERS:
+                frame = f.read(5)
+                if len(frame) < 5:
+                    return None
+                height, width = struct.unpack('>HH', frame[1:5])
+                return width, height
+            f.seek(length - 2, os.SEEK_CUR)
+
+def _label_dir(img_dir):
+    """
+    Get the label directory matching an image directory, the way YOLO looks up labels.
+    
+    Args:
+        img_dir: Image directory
+        
+    Returns:
+        The image directory with its last 'images' path component replaced by 'labels',
+        or None if the path has no 'images' component
+    """
+    images, labels = f"{os.sep}images{os.sep}", f"{os.sep}labels{os.sep}"
+    head, sep, tail = os.path.join(img_dir, '').rpartition(images)
+    if not sep:
+        return None
+    return head + labels + tail
+
+def _probe_image(number, img_path, img_dir, label_dir):
+    """
+    Check that an image can be opened and that its label file exists.
+    
+    Args:
+        number: Position of the image in the printed output
+        img_path: Path to the image
+        img_dir: Image directory that was searched for img_path
+        label_dir: Label directory matching img_dir, see _label_dir (None to skip the label check)
+        
+    Returns:
+        List of lines describing the result
+    """
+    lines = []
+    try:
+        # Read the size straight from JPEG/PNG headers; let PIL identify anything else
+        size = _read_image_size(img_path)
+        if size is None:
+            from PIL import Image
+            with Image.open(img_path) as img:
+                size = img.size
+        lines.append(f"Successfully loaded image {number}: {os.path.basename(img_path)} ({size})")
+        
+        # Check corresponding label file
+        if label_dir is None:
+            return lines
+        label_path = os.path.join(label_dir, os.path.splitext(os.path.relpath(img_path, img_dir))[0] + '.txt')
+        if os.path.exists(label_path):
+            # Every label line ends with a newline; count them without decoding or splitting
+            with open(label_path, 'rb') as f:
+                num_labels = f.read().count(b'\n')
+            lines.append(f"  Label file found with {num_labels} annotations")
+        else:
+            lines.append(f"  Label file not found: {label_path}")
+    except Exception as img_error:
+        lines.append(f"Error opening image {img_path}: {img_error}")
+    return lines
+
+def check_dataset(dataset_yaml, num_batches=2):
     """
     Test that the extracted dataset can be loaded by YOLO.
     
@@ -18,9 +187,9 @@ def test_dataset(dataset_yaml, num_batches=2):
     if not dataset_path.exists():
         raise FileNotFoundError(f"Dataset YAML file not found: {dataset_yaml}")
     
-    # Load YAML file to check its content
-    with open(dataset_path, 'r') as f:
-        data_config = yaml.safe_load(f)
+    # Load YAML file to check its content; repeated runs reuse the parse (in memory, or the
+    # JSON sidecar written next to it) while the file is unchanged
+    data_config = load_yaml(dataset_yaml, sidecar=True)
         
     # Print dataset information
     print(f"Dataset path: {data_config.get('path', 'Not specified')}")
@@ -29,8 +198,8 @@ def test_dataset(dataset_yaml, num_batches=2):
     print(f"Number of classes: {data_config.get('nc', 'Not specified')}")
     print(f"Class names: {data_config.get('names', 'Not specified')}")
     
-    # Create a YOLO model to load and test the dataset
-    model = YOLO('yolov8n.pt')  # Use a small model for quick testing
+    # Get a YOLO model to load and test the dataset
+    model = _get_model('yolov8n.pt')  # Use a small model for quick testing
     
     # Alternative validation approach
     try:
@@ -54,37 +223,32 @@ def test_dataset(dataset_yaml, num_batches=2):
         # Try an even simpler test - just load a few images from the dataset
         try:
             print("\nAttempting basic dataset loading test...")
-            import glob
-            from PIL import Image
-            
-            # Get image paths from the dataset
+            # Get the first few image paths from the dataset
             img_dir = os.path.join(data_config.get('path'), data_config.get('train'))
-            img_paths = glob.glob(os.path.join(img_dir, '**', '*.jpg'), recursive=True)
-            if not img_paths:
-                img_paths = glob.glob(os.path.join(img_dir, '**', '*.png'), recursive=True)
+            img_paths = list(_iter_images(img_dir, limit=5))
             
             if not img_paths:
                 print(f"No images found in {img_dir}")
                 return False
                 
-            print(f"Found {len(img_paths)} images in dataset")
+            print(f"Found images in dataset, checking the first {len(img_paths)}")
+            
+            # YOLO finds labels by replacing the 'images' directory with 'labels'
+            label_dir = _label_dir(img_dir)
+            if label_dir is None:
+                print(f"No 'images' directory in {img_dir}; YOLO cannot locate the label files, skipping the label check")
             
-            # Try to open a few images
-            for i, img_path in enumerate(img_paths[:5]):
-                try:
-                    img = Image.open(img_path)
-                    print(f"Successfully loaded image {i+1}: {os.path.basename(img_path)} ({img.size})")
-                    
-                    # Check corresponding label file
-                    label_path = img_path.replace('images', 'labels').rsplit('.', 1)[0] + '.txt'
-                    if os.path.exists(label_path):
-                        with open(label_path, 'r') as f:
-                            labels = f.readlines()
-                        print(f"  Label file found with {len(labels)} annotations")
-                    else:
-                        print(f"  Label file not found: {label_path}")
-                except Exception as img_error:
-                    print(f"Error opening image {img_path}: {img_error}")
+            # Probe the images in parallel; results are written at once, in the original order
+            with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+                results = executor.map(
+                    _probe_image, 
+                    range(1, len(img_paths) + 1), 
+                    img_paths, 
+                    repeat(img_dir), 
+                    repeat(label_dir)
+                )
+                lines = [line for image_lines in results for line in image_lines]
+            sys.stdout.write('\n'.join(lines) + '\n')
             
             print("\nBasic dataset loading test completed. Your dataset structure appears valid.")
             print("You can proceed with training, but be aware that the automatic validation failed.")
@@ -100,7 +264,7 @@ if __name__ == "__main__":
     dataset_yaml = "/fast_data/rwm_dataset_yolov11/dataset.yaml"
     
     # Test the dataset
-    success = test_dataset(dataset_yaml)
+    success = check_dataset(dataset_yaml)
     
     if success:
         print("\n✅ Dataset verification passed! Ready for training.")
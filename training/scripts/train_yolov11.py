@@ -3,6 +3,20 @@ import argparse
 import os
 import yaml
 
+def parse_device(value):
+    """
+    Convert the --device argument once, when the arguments are parsed.
+    
+    Args:
+        value: Device string, e.g. '0', '0,1' or 'cpu'
+        
+    Returns:
+        Tuple of GPU indices for several devices, a single GPU index, or the string itself (e.g. 'cpu')
+    """
+    if ',' in value:
+        return tuple(int(x) for x in value.split(','))
+    return int(value) if value.isdigit() else value
+
 def parse_args():
     parser = argparse.ArgumentParser(description='Train YOLOv11 on RWM dataset')
     parser.add_argument('--data', type=str, default='/fast_data/rwm_dataset_yolov11/dataset.yaml', 
@@ -15,7 +29,7 @@ def parse_args():
                         help='Batch size')
     parser.add_argument('--img-size', type=int, default=1280, 
                         help='Image size')
-    parser.add_argument('--device', type=str, default='0', 
+    parser.add_argument('--device', type=parse_device, default='0', 
                         help='Device(s) to use for training (comma-separated)')
     parser.add_argument('--workers', type=int, default=8, 
                         help='Number of worker threads')
@@ -26,20 +40,9 @@ def parse_args():
 def main():
     args = parse_args()
     
-    # Convert device string to list if multiple devices
-    devices = [int(x) for x in args.device.split(',')] if ',' in args.device else args.device
-    
     # Load the model
     model = YOLO(args.model)
     
-    # Try to use FocalLoss if available
-    try:
-        from ultralytics.utils.loss import FocalLoss
-        model.loss = FocalLoss()
-        print("Using FocalLoss")
-    except (ImportError, AttributeError):
-        print("FocalLoss not available, using default loss")
-    
     # Train the model
     results = model.train(
         verbose=True,
@@ -58,7 +61,7 @@ def main():
         cls=1.0,
         batch=args.batch_size,
         optimizer="auto",
-        device=devices,
+        device=args.device,
         project="runs/detection/",
         name=args.name,
         # Augmentations